@@ -0,0 +1,13 @@
+"""
+Settings for `python manage.py benchmark --settings=demo.benchmark_settings`:
+same project, on a throwaway SQLite database so runs are comparable.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',
+    }
+}
@@ -12,14 +12,43 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os 
-from decouple import config
+from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Get the key from an environment variable (MOST SECURE)
-FIELD_ENCRYPTION_KEY = config('FIELD_ENCRYPTION_KEY')
+# Comma separated to rotate it: the first key encrypts, every key decrypts
+# (new key first, old one kept until manage.py rotate_keys has run)
+FIELD_ENCRYPTION_KEY = config('FIELD_ENCRYPTION_KEY', cast=Csv(post_process=tuple))
+
+# Key for the HMAC lookup keys of encrypted Dbbi rows, separate from the field
+# keys: it does not change when FIELD_ENCRYPTION_KEY rotates (a new one means
+# manage.py reindex_blind_index)
+BLIND_INDEX_KEY = config('BLIND_INDEX_KEY', default=None)
+if not BLIND_INDEX_KEY:
+    raise ImproperlyConfigured("Set BLIND_INDEX_KEY (python generate_key.py prints one)")
+
+# Rows per INSERT when saving parsed Excel data
+DBBI_BULK_BATCH_SIZE = config('DBBI_BULK_BATCH_SIZE', default=1000, cast=int)
+
+# /api/dbbi/all/: rows decrypted per chunk when streaming, max rows per page
+DBBI_STREAM_CHUNK_SIZE = config('DBBI_STREAM_CHUNK_SIZE', default=2000, cast=int)
+DBBI_MAX_PAGE_SIZE = config('DBBI_MAX_PAGE_SIZE', default=5000, cast=int)
+
+# Background ingestion jobs (parse-excel with async=1)
+INGESTION_UPLOAD_DIR = config('INGESTION_UPLOAD_DIR', default=str(BASE_DIR / 'uploads'))
+INGESTION_MAX_WORKERS = config('INGESTION_MAX_WORKERS', default=2, cast=int)  # files processed at once
+INGESTION_MAX_QUEUED = config('INGESTION_MAX_QUEUED', default=10, cast=int)  # pending + running per process
+INGESTION_CHUNK_ROWS = config('INGESTION_CHUNK_ROWS', default=5000, cast=int)  # rows per streamed (and committed) chunk
+
+# Batch uploads (parse-excel/batch/): workbooks parsed at once in separate
+# processes, and limits per request (zip archives are counted uncompressed)
+BATCH_PARSE_WORKERS = config('BATCH_PARSE_WORKERS', default=os.cpu_count() or 1, cast=int)
+BATCH_MAX_FILES = config('BATCH_MAX_FILES', default=100, cast=int)
+BATCH_MAX_BYTES = config('BATCH_MAX_BYTES', default=500 * 1024 * 1024, cast=int)
 
 
 # Quick-start development settings - unsuitable for production
@@ -55,6 +84,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.middleware.ProfilingMiddleware',  # no-op unless PROFILING_ENABLED, needs request.user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -109,6 +139,57 @@ DATABASES = {
 }
 
 
+# FunctionResult audit trail (@post decorator)
+AUDIT_ASYNC = config('AUDIT_ASYNC', default=True, cast=bool)  # write from a background thread
+AUDIT_SAMPLE_RATE = config('AUDIT_SAMPLE_RATE', default=1.0, cast=float)  # share of successful calls recorded
+AUDIT_MAX_RESULT_BYTES = config('AUDIT_MAX_RESULT_BYTES', default=10000, cast=int)  # larger values are summarized
+AUDIT_TRACEMALLOC = config('AUDIT_TRACEMALLOC', default=False, cast=bool)  # peak memory of each call (else NULL), slows the call
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 2.0  # seconds
+
+
+# Threads for the async KPI endpoints (/api/async/...): aggregation work and
+# concurrent queries, each thread holds its own database connection while busy
+ASYNC_KPI_WORKERS = config('ASYNC_KPI_WORKERS', default=4, cast=int)
+
+
+# Parallel full scans of Dbbi (rebuild_aggregates --workers, parallel_scan):
+# processes decrypting at once, and ids per range handed to a process
+PARALLEL_SCAN_WORKERS = config('PARALLEL_SCAN_WORKERS', default=os.cpu_count() or 1, cast=int)
+PARALLEL_SCAN_CHUNK_SIZE = config('PARALLEL_SCAN_CHUNK_SIZE', default=20000, cast=int)
+
+
+# Parquet archive of the Dbbi rows (myapp.services.archive, needs pyarrow):
+# every bulk_save also appends what it wrote when enabled, rebuild_archive
+# rewrites it from the database
+ARCHIVE_ENABLED = config('ARCHIVE_ENABLED', default=False, cast=bool)
+ARCHIVE_DIR = config('ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+
+# Request profiling (myapp.middleware.ProfilingMiddleware), off by default
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_TRACEMALLOC = config('PROFILING_TRACEMALLOC', default=False, cast=bool)  # peak memory of every request, slow
+PROFILING_WINDOW = 500  # requests kept per endpoint for /api/profiling/metrics/
+PROFILING_DUMP_DIR = config('PROFILING_DUMP_DIR', default=str(BASE_DIR / 'profiles'))
+
+
+# Cache
+# Local memory by default. The KPI dataset version lives in the database, so
+# a bump after an upload reaches every worker process right away; a shared
+# backend (Redis, Memcached) only saves recomputing the same KPIs per process.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='datapulse'),
+    }
+}
+
+KPI_CACHE_ALIAS = 'default'
+KPI_CACHE_TIMEOUT = config('KPI_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -149,3 +230,16 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# myapp.* loggers (ingestion errors, audit failures) to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'myapp': {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO')},
+    },
+}
@@ -1,9 +1,11 @@
 from cryptography.fernet import Fernet
 
-# Generate a valid key
+# Generate a valid key, and a separate one for the blind index
 key = Fernet.generate_key().decode()
+index_key = Fernet.generate_key().decode()
 print('Your encryption key:')
 print(key)
 print('')
 print('Add this to your .env file as:')
 print(f'FIELD_ENCRYPTION_KEY="{key}"')
+print(f'BLIND_INDEX_KEY="{index_key}"')
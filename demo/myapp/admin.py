@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Dbbi, FunctionResult
+from .models import Dbbi, FunctionResult, IngestedFile, IngestionJob
+from .services.durations import ABSENT, format_clock, format_cumulative
 
 @admin.register(Dbbi)
 class DbbiAdmin(admin.ModelAdmin):
@@ -8,9 +9,40 @@ class DbbiAdmin(admin.ModelAdmin):
     search_fields = ['nom']
     # date_hierarchy = "date_plain"
 
+    def _clock(self, obj, seconds):
+        return format_clock(seconds) or (ABSENT if obj.absent else None)
+
+    @admin.display(description='Entrée')
+    def entree(self, obj):
+        return self._clock(obj, obj.entree_seconds)
+
+    @admin.display(description='Sortie')
+    def sortie(self, obj):
+        return self._clock(obj, obj.sortie_seconds)
+
+    @admin.display(description='Travail')
+    def travail(self, obj):
+        return self._clock(obj, obj.travail_seconds)
+
+    @admin.display(description='Travail cumulé')
+    def travail_cumulee(self, obj):
+        return format_cumulative(obj.travail_cumulee_seconds)
+
 @admin.register(FunctionResult)
 class FunctionResultAdmin(admin.ModelAdmin):
-    list_display = ['function_name', 'success', 'executed_at']
+    list_display = ['function_name', 'success', 'executed_at', 'wall_time_ms', 'cpu_time_ms', 'peak_memory_bytes']
     list_filter = ['success', 'function_name']
     readonly_fields = ['created_at']
-    search_fields = ['function_name']
\ No newline at end of file
+    search_fields = ['function_name']
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'status', 'rows_parsed', 'rows_saved', 'inserted', 'updated', 'skipped', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+@admin.register(IngestedFile)
+class IngestedFileAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'rows', 'inserted', 'updated', 'skipped', 'created_at']
+    search_fields = ['file_name', 'fingerprint']
+    readonly_fields = ['created_at']
@@ -0,0 +1,181 @@
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from myapp.services import kpi_cache
+from myapp.services.myapp import extract_attendance, compute_cumulative, read_excel
+from myapp.services.result_service import audit_queue
+from myapp.services.synthetic import write_synthetic_workbook
+
+KPI_ENDPOINTS = [
+    'best_employee',
+    'worst_employee',
+    'average_hours',
+    'weekly_trends',
+    'all_employees',
+    'dashboard_summary',
+    'heures_realisees',
+    'heures_restantes',
+    'heures_restantes_par_employe',
+]
+
+
+def _stats(runs):
+    return {
+        'runs': [round(run, 6) for run in runs],
+        'min': round(min(runs), 6),
+        'median': round(statistics.median(runs), 6),
+        'mean': round(statistics.mean(runs), 6),
+        'max': round(max(runs), 6),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Timed ingestion and KPI scenarios on a synthetic workbook, against a fresh test "
+        "database. Run with --settings=demo.benchmark_settings to use SQLite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=50)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--absence-rate', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--compare', help="Baseline JSON from an earlier run, fail on regressions")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed slowdown of a scenario's best run before it counts as a regression")
+
+    def _time(self, label, func, repeat):
+        runs = []
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            runs.append(time.perf_counter() - start)
+        self.results[label] = _stats(runs)
+        self.stdout.write(f"{label:<50} median {self.results[label]['median'] * 1000:10.2f} ms")
+        return result
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.results = {}
+
+        path = os.path.join(tempfile.gettempdir(), f"datapulse_bench_{os.getpid()}.xlsx")
+        rows = write_synthetic_workbook(
+            path,
+            employees=options['employees'],
+            days=options['days'],
+            absence_rate=options['absence_rate'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Synthetic workbook: {rows} rows ({options['employees']} employees x {options['days']} days)")
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._run_scenarios(path, repeat)
+        finally:
+            audit_queue().close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            os.remove(path)
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'rows': rows,
+                'employees': options['employees'],
+                'days': options['days'],
+                'absence_rate': options['absence_rate'],
+                'seed': options['seed'],
+                'repeat': repeat,
+            },
+            'scenarios': self.results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            self._compare(options['compare'], options['threshold'])
+
+    def _run_scenarios(self, path, repeat):
+        # Imported here: views pull in the @post audit trail and its settings
+        from myapp.views import parse_excel, save_to_database
+
+        def parse():
+            with open(path, 'rb') as file_obj:
+                return parse_excel(file_obj)
+
+        parsed = self._time('parse_excel', parse, repeat)
+        with open(path, 'rb') as file_obj:
+            extracted = extract_attendance(read_excel(file_obj))
+        self._time('compute_cumulative', lambda: compute_cumulative(extracted.copy()), repeat)
+
+        records = parsed.to_dict('records')
+        self._time('save_to_database (insert)', lambda: save_to_database(records), 1)
+        self._time('save_to_database (unchanged re-upload)', lambda: save_to_database(records), repeat)
+
+        client = Client()
+        for name in KPI_ENDPOINTS:
+            url = reverse(name)
+
+            def cold():
+                kpi_cache.bump_version()
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} returned {response.status_code}")
+
+            self._time(f"GET {url} (cold)", cold, repeat)
+            self._time(f"GET {url} (cached)", lambda: client.get(url), repeat)
+
+    def _compare(self, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')})")
+
+        regressions = []
+        for label, current in self.results.items():
+            previous = baseline['scenarios'].get(label)
+            if not previous or not previous['min']:
+                continue
+            # Best run: the least sensitive to noise from other processes
+            ratio = current['min'] / previous['min']
+            line = f"{label:<50} x{ratio:6.2f}"
+            if ratio > 1 + threshold:
+                regressions.append(label)
+                self.stdout.write(self.style.ERROR(line + "  regression"))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} scenario(s) slower than x{1 + threshold:.2f}: {regressions}")
+        self.stdout.write(self.style.SUCCESS("No regression"))
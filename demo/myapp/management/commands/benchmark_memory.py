@@ -0,0 +1,56 @@
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from myapp.services.myapp import build_attendance, read_excel
+from myapp.services.streaming import ingest_stream
+from myapp.services.synthetic import write_synthetic_workbook
+
+
+class Command(BaseCommand):
+    help = "Peak memory of the streaming Excel path on a synthetic workbook (default 1M rows)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=4000)
+        parser.add_argument('--days', type=int, default=250)
+        parser.add_argument('--chunk-rows', type=int, nargs='+', default=[1000, 5000, 20000])
+        parser.add_argument('--persist', action='store_true', help="Also save the rows to the database")
+        parser.add_argument('--compare', action='store_true', help="Also measure the whole-file pandas path")
+        parser.add_argument('--path', help="Reuse or keep the workbook at this path")
+
+    def _measure(self, label, func):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{label:<28} peak {peak / 2**20:8.1f} MiB  {elapsed:8.1f}s")
+
+    def handle(self, *args, **options):
+        path = options['path'] or os.path.join(tempfile.gettempdir(), 'datapulse_benchmark.xlsx')
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            rows = write_synthetic_workbook(path, employees=options['employees'], days=options['days'])
+            self.stdout.write(f"Wrote {rows} rows to {path} in {time.perf_counter() - start:.1f}s")
+        self.stdout.write(f"Workbook size: {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        for chunk_rows in options['chunk_rows']:
+            def run():
+                with open(path, 'rb') as file_obj:
+                    ingest_stream(file_obj, chunk_rows, persist=options['persist'])
+            self._measure(f"streaming chunk={chunk_rows}", run)
+
+        if options['compare']:
+            def run_full():
+                with open(path, 'rb') as file_obj:
+                    build_attendance(read_excel(file_obj))
+            self._measure("whole file (pandas)", run_full)
+
+        if not options['path']:
+            os.remove(path)
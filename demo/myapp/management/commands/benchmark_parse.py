@@ -0,0 +1,53 @@
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.services.myapp import (
+    OUTPUT_COLUMNS,
+    _compute_cumulative_rowwise,
+    _extract_attendance_rowwise,
+    compute_cumulative,
+    extract_attendance,
+)
+from myapp.services.synthetic import synthetic_sheet
+
+
+class Command(BaseCommand):
+    help = "Compare the columnar Excel parse path against the original row-wise loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=200)
+        parser.add_argument('--days', type=int, default=250)
+        parser.add_argument('--absence-rate', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        df = synthetic_sheet(
+            employees=options['employees'],
+            days=options['days'],
+            absence_rate=options['absence_rate'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Synthetic sheet: {len(df)} rows")
+
+        start = time.perf_counter()
+        extracted = _extract_attendance_rowwise(df)
+        extract_rowwise = time.perf_counter() - start
+        rowwise = pd.DataFrame(_compute_cumulative_rowwise(extracted), columns=OUTPUT_COLUMNS)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        extracted = extract_attendance(df)
+        extract_columnar = time.perf_counter() - start
+        columnar = compute_cumulative(extracted)[OUTPUT_COLUMNS]
+        columnar_time = time.perf_counter() - start
+
+        if not rowwise.equals(columnar):
+            raise CommandError("Columnar parse result differs from the row-wise path")
+
+        self.stdout.write(f"row-wise: {rowwise_time:.3f}s (extract {extract_rowwise:.3f}s, cumulative {rowwise_time - extract_rowwise:.3f}s)")
+        self.stdout.write(f"columnar: {columnar_time:.3f}s (extract {extract_columnar:.3f}s, cumulative {columnar_time - extract_columnar:.3f}s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Results identical, speedup x{rowwise_time / columnar_time:.1f}"
+        ))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+from encrypted_model_fields import fields as encrypted_fields
+
+from myapp.models import Dbbi
+from myapp.services import projection
+
+# Columns read by each full Dbbi scan (the KPI views read the daily aggregates)
+SCANS = {
+    '/api/dbbi/ and exports': (
+        'nom', 'date', 'entree_seconds', 'sortie_seconds', 'travail_seconds', 'travail_cumulee_seconds', 'absent',
+    ),
+    'snapshot / rebuild_aggregates / parallel_scan': ('nom', 'date', 'travail_seconds', 'absent'),
+    'cumulative.recompute': ('travail_seconds', 'travail_cumulee_seconds'),
+}
+
+
+class Command(BaseCommand):
+    help = "Per-row cost of full model instances vs only() vs projected tuples on the Dbbi table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def _count_decryptions(self):
+        original = encrypted_fields.decrypt_str
+        calls = [0]
+
+        def counting(value):
+            calls[0] += 1
+            return original(value)
+
+        encrypted_fields.decrypt_str = counting
+        return calls, lambda: setattr(encrypted_fields, 'decrypt_str', original)
+
+    def _measure(self, scan, repeat):
+        best = None
+        calls, restore = self._count_decryptions()
+        try:
+            for _ in range(repeat):
+                calls[0] = 0
+                start = time.perf_counter()
+                count = scan()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            restore()
+        return count, best, calls[0]
+
+    def handle(self, *args, **options):
+        total = Dbbi.objects.count()
+        if not total:
+            self.stdout.write(self.style.WARNING("The Dbbi table is empty, upload a file first"))
+            return
+        chunk_size = options['chunk_size']
+        self.stdout.write(f"{total} Dbbi rows, best of {options['repeat']}")
+
+        for name, fields in SCANS.items():
+            strategies = {
+                'model instances': lambda: sum(
+                    1 for row in Dbbi.objects.order_by('id').iterator(chunk_size=chunk_size)
+                    if [getattr(row, f) for f in fields]
+                ),
+                'only()': lambda: sum(
+                    1 for row in Dbbi.objects.only(*fields).order_by('id').iterator(chunk_size=chunk_size)
+                    if [getattr(row, f) for f in fields]
+                ),
+                'projected tuples': lambda: sum(
+                    1 for _ in projection.rows(fields, chunk_size=chunk_size)
+                ),
+            }
+            self.stdout.write(f"\n{name} ({', '.join(fields)})")
+            for label, scan in strategies.items():
+                count, elapsed, decryptions = self._measure(scan, options['repeat'])
+                self.stdout.write(
+                    f"  {label:<18} {elapsed * 1e6 / count:8.1f} us/row  "
+                    f"{decryptions / count:4.1f} decryptions/row  {elapsed:.3f}s"
+                )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.services import snapshot
+from myapp.services.kpi import compute_kpis
+
+
+class Command(BaseCommand):
+    help = "Build the decrypted columnar Dbbi snapshot and report its footprint and build time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--from-archive', action='store_true',
+                            help="Build it from the Parquet archive instead of the Dbbi table")
+
+    def handle(self, *args, **options):
+        if options['from_archive']:
+            from myapp.services import archive
+            snap = archive.build_snapshot()
+        else:
+            snap = snapshot.build_snapshot(chunk_size=options['chunk_size'])
+        stats = snap.stats()
+        self.stdout.write(
+            f"{stats['rows']} rows, {stats['employees']} employees, "
+            f"{stats['memory_bytes'] / 1024:.1f} KiB, built in {stats['build_seconds']:.2f}s"
+        )
+
+        start = time.perf_counter()
+        from_snapshot = snap.kpis()
+        snapshot_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        from_aggregates = compute_kpis()
+        aggregates_ms = (time.perf_counter() - start) * 1000
+
+        self.stdout.write(f"KPIs from snapshot: {snapshot_ms:.1f}ms, from daily aggregates: {aggregates_ms:.1f}ms")
+        if from_snapshot.total_worked != from_aggregates.total_worked:
+            self.stdout.write(self.style.WARNING(
+                f"Totals differ: {from_snapshot.total_worked}s vs {from_aggregates.total_worked}s, "
+                "run rebuild_aggregates"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Snapshot totals match the daily aggregates"))
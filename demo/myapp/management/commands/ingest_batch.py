@@ -0,0 +1,38 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.services import batch
+
+
+class Command(BaseCommand):
+    help = "Parse several workbooks and / or zip archives in parallel and save them in one pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--workers', type=int, default=None, help="Default BATCH_PARSE_WORKERS")
+        parser.add_argument('--force', action='store_true', help="Process workbooks even if already ingested")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            uploads = [stack.enter_context(open(path, 'rb')) for path in options['paths']]
+            try:
+                files, report = batch.ingest(uploads, force=options['force'], workers=options['workers'])
+            except batch.BatchError as e:
+                raise CommandError(str(e))
+
+        for batch_file in files:
+            line = (
+                f"{batch_file.name}: {batch_file.status}, {batch_file.rows} rows, "
+                f"{batch_file.report.inserted} inserted, {batch_file.report.updated} updated, "
+                f"{batch_file.report.skipped} skipped"
+            )
+            if batch_file.error:
+                line += f" ({batch_file.error})"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(files)} workbooks: {report.inserted} inserted, {report.updated} updated, "
+            f"{report.skipped} skipped in {time.perf_counter() - start:.1f}s"
+        ))
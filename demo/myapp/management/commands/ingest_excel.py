@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.services.persistence import file_fingerprint, find_ingested, record_ingested
+from myapp.services.streaming import ingest_stream
+
+
+class Command(BaseCommand):
+    help = "Stream a large attendance workbook into the database chunk by chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-rows', type=int, default=None)
+        parser.add_argument('--force', action='store_true', help="Process the file even if it was already ingested")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        def progress(rows_parsed, rows_saved, report):
+            self.stdout.write(
+                f"\r{rows_parsed} parsed, {rows_saved} saved, "
+                f"{report.inserted} inserted, {report.updated} updated, {report.skipped} skipped",
+                ending='',
+            )
+
+        with open(options['path'], 'rb') as file_obj:
+            fingerprint = file_fingerprint(file_obj)
+            previous = find_ingested(fingerprint)
+            if previous and not options['force']:
+                self.stdout.write(self.style.WARNING(
+                    f"Already ingested on {previous.created_at:%Y-%m-%d %H:%M} as {previous.file_name}, "
+                    f"nothing to do (use --force to process it again)"
+                ))
+                return
+            rows_parsed, report = ingest_stream(file_obj, options['chunk_rows'], progress=progress)
+
+        record_ingested(fingerprint, os.path.basename(options['path']), os.path.getsize(options['path']), rows_parsed, report)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows_parsed} rows parsed: {report.inserted} inserted, {report.updated} updated, "
+            f"{report.skipped} skipped in {time.perf_counter() - start:.1f}s"
+        ))
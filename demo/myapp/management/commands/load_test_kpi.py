@@ -0,0 +1,80 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests per second of a KPI endpoint through the WSGI handler (threads) and the "
+        "ASGI handler (sync DRF view and its /api/async/ version), in-process on the current database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', default='dashboard-summary')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--cached', action='store_true',
+                            help="Let the KPI cache answer (by default every request is a cache miss)")
+
+    def _url(self, prefix, i, cached):
+        url = f"/api/{prefix}{self.endpoint}/"
+        return url if cached else f"{url}?_={i}"
+
+    def _report(self, label, elapsed, statuses):
+        errors = sum(1 for code in statuses if code != 200)
+        self.stdout.write(
+            f"{label:<32} {len(statuses) / elapsed:8.1f} req/s  "
+            f"({len(statuses)} requests in {elapsed:.2f}s, {errors} errors)"
+        )
+        return len(statuses) / elapsed
+
+    def _wsgi(self, count, concurrency, cached):
+        def worker(indexes):
+            client = Client()
+            try:
+                return [client.get(self._url('', i, cached)).status_code for i in indexes]
+            finally:
+                connection.close()
+
+        slices = [range(start, count, concurrency) for start in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = [code for codes in pool.map(worker, slices) for code in codes]
+        return time.perf_counter() - start, statuses
+
+    async def _asgi(self, prefix, count, concurrency, cached):
+        client = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with slots:
+                response = await client.get(self._url(prefix, i, cached))
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(one(i) for i in range(count)))
+        return time.perf_counter() - start, statuses
+
+    def handle(self, *args, **options):
+        self.endpoint = options['endpoint'].strip('/')
+        count = options['requests']
+        concurrency = options['concurrency']
+        cached = options['cached']
+        setup_test_environment()
+
+        if Client().get(f"/api/{self.endpoint}/").status_code != 200:
+            raise CommandError(f"/api/{self.endpoint}/ does not answer 200")
+
+        self.stdout.write(f"{count} x /api/{self.endpoint}/, concurrency {concurrency}, "
+                          f"{'cached' if cached else 'cache misses'}")
+        wsgi = self._report("WSGI, sync view", *self._wsgi(count, concurrency, cached))
+        asgi_sync = self._report("ASGI, sync view", *asyncio.run(self._asgi('', count, concurrency, cached)))
+        asgi_async = self._report("ASGI, async view", *asyncio.run(self._asgi('async/', count, concurrency, cached)))
+        self.stdout.write(
+            f"async view vs WSGI: x{asgi_async / wsgi:.2f}, vs sync view under ASGI: x{asgi_async / asgi_sync:.2f}"
+        )
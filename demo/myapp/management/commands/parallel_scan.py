@@ -0,0 +1,45 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.services import parallel_scan, snapshot
+
+
+class Command(BaseCommand):
+    help = "Compute the KPIs with a parallel scan of Dbbi and check them against the serial scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Default PARALLEL_SCAN_WORKERS")
+        parser.add_argument('--range-size', type=int, default=None, help="Default PARALLEL_SCAN_CHUNK_SIZE")
+        parser.add_argument('--skip-serial', action='store_true', help="Only time the parallel scan")
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.PARALLEL_SCAN_WORKERS
+        range_size = options['range_size'] or settings.PARALLEL_SCAN_CHUNK_SIZE
+
+        start = time.perf_counter()
+        parallel = parallel_scan.parallel_kpis(workers=workers, chunk_size=range_size)
+        parallel_seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Parallel scan: {parallel.total_records} records, {parallel.employee_count} employees "
+            f"in {parallel_seconds:.2f}s ({workers} workers, {range_size} ids per range)"
+        )
+        if options['skip_serial']:
+            return
+
+        start = time.perf_counter()
+        serial = snapshot.build_snapshot().kpis()
+        serial_seconds = time.perf_counter() - start
+        self.stdout.write(f"Serial scan: {serial_seconds:.2f}s, speedup x{serial_seconds / parallel_seconds:.2f}")
+
+        mismatches = [
+            name for name in ('worked', 'present', 'absent', 'weekday_worked', 'weekday_present')
+            if not np.array_equal(getattr(parallel, name), getattr(serial, name))
+        ]
+        if parallel.noms != serial.noms:
+            mismatches.insert(0, 'noms')
+        if mismatches:
+            raise CommandError(f"Parallel scan differs from the serial scan: {', '.join(mismatches)}")
+        self.stdout.write(self.style.SUCCESS("Parallel scan matches the serial scan"))
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.services import aggregates, parallel_scan
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-employee daily aggregates from the Dbbi table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Decrypt in this many processes (0: PARALLEL_SCAN_WORKERS)")
+        parser.add_argument('--range-size', type=int, default=None,
+                            help="Ids per range handed to a worker (default PARALLEL_SCAN_CHUNK_SIZE)")
+        parser.add_argument('--from-archive', action='store_true',
+                            help="Read the Parquet archive instead of decrypting the table (see rebuild_archive)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        workers = options['workers'] or settings.PARALLEL_SCAN_WORKERS
+        groups = None
+        if options['from_archive']:
+            from myapp.services import archive
+            workers = 1
+            groups = archive.daily_groups()
+        elif workers > 1:
+            groups = parallel_scan.parallel_daily_groups(workers=workers, chunk_size=options['range_size'])
+        count = aggregates.rebuild(chunk_size=options['chunk_size'], groups=groups)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {count} daily aggregates in {time.perf_counter() - start:.2f}s ({workers} worker(s))"
+        ))
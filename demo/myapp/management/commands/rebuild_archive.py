@@ -0,0 +1,27 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.services import archive
+
+
+class Command(BaseCommand):
+    help = "Rewrite the Parquet archive (ARCHIVE_DIR) from the Dbbi table, one file per month"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows, months = archive.rebuild(chunk_size=options['chunk_size'])
+        size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for directory, _, names in os.walk(settings.ARCHIVE_DIR)
+            for name in names
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {rows} rows in {months} month(s), {size / 1024:.1f} KiB, "
+            f"in {time.perf_counter() - start:.2f}s ({settings.ARCHIVE_DIR})"
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp.models import Dbbi
+from myapp.services import cumulative, kpi_cache
+
+
+class Command(BaseCommand):
+    help = "Recompute every employee's travail_cumulee and running total from their whole history"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        employee_keys = list(
+            Dbbi.objects.exclude(employee_key=None).order_by().values_list('employee_key', flat=True).distinct()
+        )
+        rewritten = 0
+        for employee_key in employee_keys:
+            with transaction.atomic():
+                rewritten += cumulative.recompute(employee_key)
+        kpi_cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(employee_keys)} employees, {rewritten} rows rewritten in {time.perf_counter() - start:.1f}s"
+        ))
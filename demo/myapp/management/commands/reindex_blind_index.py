@@ -0,0 +1,27 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.services import key_rotation
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the blind index columns (lookup_key, employee_key, content_hash) with the current "
+        "BLIND_INDEX_KEY, after changing it. Stop ingestion while it runs: rows not reindexed yet "
+        "are not matched by uploads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Default PARALLEL_SCAN_WORKERS")
+        parser.add_argument('--range-size', type=int, default=None,
+                            help="Ids per range and transaction (default PARALLEL_SCAN_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = key_rotation.reindex(options['workers'], options['range_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {rows} rows in {time.perf_counter() - start:.2f}s"))
+        if os.path.isdir(settings.ARCHIVE_DIR):
+            self.stdout.write("Run rebuild_archive too: the Parquet archive still holds the old lookup keys")
@@ -0,0 +1,107 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Dbbi
+from myapp.services import key_rotation
+from myapp.services.blind_index import blind_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encrypt every encrypted column with the first FIELD_ENCRYPTION_KEY. "
+        "Deploy with FIELD_ENCRYPTION_KEY=new,old first, run this, check with --check, "
+        "then drop the old key."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Default PARALLEL_SCAN_WORKERS")
+        parser.add_argument('--range-size', type=int, default=None,
+                            help="Ids per range and transaction (default PARALLEL_SCAN_CHUNK_SIZE)")
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / 'key_rotation.json'),
+                            help="Progress file, an interrupted rotation resumes from it")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start over")
+        parser.add_argument('--check', action='store_true',
+                            help="Only count the values the first key alone cannot decrypt")
+
+    def handle(self, *args, **options):
+        keys = settings.FIELD_ENCRYPTION_KEY
+        workers = options['workers'] or settings.PARALLEL_SCAN_WORKERS
+
+        if options['check']:
+            self._check(workers, options['range_size'])
+            return
+
+        if len(keys) < 2:
+            raise CommandError("FIELD_ENCRYPTION_KEY lists a single key: set it to 'new_key,old_key'")
+        self._check_blind_index()
+        if settings.BLIND_INDEX_KEY in keys[1:]:
+            self.stdout.write(self.style.WARNING(
+                "BLIND_INDEX_KEY is one of the old field keys, the old key cannot be retired until "
+                "BLIND_INDEX_KEY is set to a key of its own and reindex_blind_index has run"
+            ))
+
+        checkpoint = key_rotation.Checkpoint(options['checkpoint'])
+        if options['restart'] or checkpoint.key is None:
+            checkpoint.start(options['range_size'])
+        elif checkpoint.key != key_rotation.key_id():
+            raise CommandError(
+                f"{options['checkpoint']} belongs to a rotation to another key, run with --restart"
+            )
+        elif checkpoint.complete:
+            self.stdout.write(f"Already rotated to this key ({options['checkpoint']}), --restart to run again")
+            return
+        else:
+            self.stdout.write(f"Resuming from {options['checkpoint']}")
+
+        start = time.perf_counter()
+        try:
+            workers = key_rotation.rotate(checkpoint, workers=workers, progress=self._progress)
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted, progress saved to {options['checkpoint']}")
+
+        for label, state in checkpoint.data['models'].items():
+            rate = state['rows'] / state['seconds'] if state['seconds'] else 0
+            self.stdout.write(
+                f"{label}: {state['rows']} rows in {state['seconds']:.2f}s ({rate:.0f} rows/s, {workers} worker(s))"
+            )
+            if state['invalid']:
+                self.stdout.write(self.style.WARNING(
+                    f"{label}: {state['invalid']} values no configured key decrypts were left as they are"
+                ))
+        self.stdout.write(self.style.SUCCESS(f"Rotation done in {time.perf_counter() - start:.2f}s"))
+        if os.path.isdir(settings.ARCHIVE_DIR):
+            self.stdout.write("Run rebuild_archive too: the Parquet archive keys are still wrapped with the old key")
+
+    def _check_blind_index(self):
+        # A lookup key that no longer matches means BLIND_INDEX_KEY changed with
+        # the field key, or the rows' key is missing (nom stays a token)
+        row = Dbbi.objects.exclude(lookup_key=None).only('nom', 'date', 'lookup_key').order_by('id').first()
+        if row is not None and blind_index(row.nom, row.date) != row.lookup_key:
+            raise CommandError(
+                "Stored rows do not match the configured keys: FIELD_ENCRYPTION_KEY must still list the "
+                "current key after the new one, and BLIND_INDEX_KEY must stay the key the rows were indexed with "
+                "(run reindex_blind_index after changing it)"
+            )
+
+    def _progress(self, label, rows, done, total, seconds):
+        rate = rows / seconds if seconds else 0
+        remaining = seconds / done * (total - done) if done else 0
+        self.stdout.write(f"{label}: {done}/{total} ranges, {rows} rows, {rate:.0f} rows/s, ~{remaining:.0f}s left")
+
+    def _check(self, workers, range_size):
+        self._check_blind_index()
+        stale_total = 0
+        for label, (rows, stale) in key_rotation.check(workers, range_size).items():
+            stale_total += stale
+            self.stdout.write(f"{label}: {rows} rows, {stale} values not under the first key")
+        if stale_total:
+            raise CommandError("Old keys are still needed, run rotate_keys")
+        if settings.BLIND_INDEX_KEY in settings.FIELD_ENCRYPTION_KEY[1:]:
+            raise CommandError(
+                "BLIND_INDEX_KEY is one of the old field keys: removing it from FIELD_ENCRYPTION_KEY would keep "
+                "it in use. Set BLIND_INDEX_KEY to a key of its own and run reindex_blind_index first"
+            )
+        self.stdout.write(self.style.SUCCESS("Every value decrypts with the first key, the old keys can be removed"))
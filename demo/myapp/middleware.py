@@ -0,0 +1,116 @@
+import cProfile
+import os
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from myapp.services import profiling
+
+PROFILE_PARAM = '_profile'  # ?_profile=cprofile or ?_profile=tracemalloc
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (PROFILING_ENABLED) per-request instrumentation: wall time, query
+    count and time, decryption time, render (serialization) time and, when
+    tracemalloc is tracing, peak allocation. Adds a Server-Timing header and
+    feeds the rolling histogram served by /api/profiling/metrics/.
+    For staff users, ?_profile=cprofile / ?_profile=tracemalloc write a dump
+    to PROFILING_DUMP_DIR, its file name is returned in X-Profile-Dump.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        profiling.install_decrypt_timer()
+        if settings.PROFILING_TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        profile = profiling.RequestProfile()
+        token = profiling.activate(profile)
+        mode = request.GET.get(PROFILE_PARAM) if self._may_dump(request) else None
+        try:
+            with connection.execute_wrapper(profiling.query_wrapper):
+                if mode == 'cprofile':
+                    response, dump = self._cprofile(request)
+                elif mode == 'tracemalloc':
+                    response, dump = self._tracemalloc(request, profile)
+                else:
+                    dump = None
+                    if tracemalloc.is_tracing():
+                        tracemalloc.reset_peak()
+                    response = self.get_response(request)
+                    if tracemalloc.is_tracing():
+                        profile.peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            profiling.deactivate(token)
+
+        total = time.perf_counter() - profile.start
+        endpoint = self._endpoint(request)
+        profiling.histogram().record(endpoint, profile, total)
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total * 1000:.2f}',
+            f'db;dur={profile.db_seconds * 1000:.2f};desc="{profile.queries} queries"',
+            f'decrypt;dur={profile.decrypt_seconds * 1000:.2f};desc="{profile.decryptions} values"',
+            f'render;dur={profile.render_seconds * 1000:.2f}',
+        ])
+        if dump:
+            response['X-Profile-Dump'] = os.path.basename(dump)
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF responses render right after this hook, time it for the profile"""
+        profile = profiling.current()
+        if profile is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                profile.render_seconds += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _may_dump(self, request):
+        # Dumps hold request internals and fill the disk: staff only
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def _endpoint(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            return match.url_name
+        return request.path
+
+    def _dump_path(self, request, extension):
+        os.makedirs(settings.PROFILING_DUMP_DIR, exist_ok=True)
+        name = f"{self._endpoint(request).replace('/', '_').strip('_')}-{uuid.uuid4().hex[:8]}.{extension}"
+        return os.path.join(settings.PROFILING_DUMP_DIR, name)
+
+    def _cprofile(self, request):
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        path = self._dump_path(request, 'prof')
+        profiler.dump_stats(path)
+        return response, path
+
+    def _tracemalloc(self, request, profile):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(25)
+        tracemalloc.reset_peak()
+        try:
+            response = self.get_response(request)
+            profile.peak_bytes = tracemalloc.get_traced_memory()[1]
+            path = self._dump_path(request, 'tracemalloc')
+            tracemalloc.take_snapshot().dump(path)
+        finally:
+            if started:
+                tracemalloc.stop()
+        return response, path
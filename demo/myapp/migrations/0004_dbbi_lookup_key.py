@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+import encrypted_model_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_remove_dbbi_created_at_alter_dbbi_entree_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbbi',
+            name='lookup_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='dbbi',
+            name='date',
+            field=encrypted_model_fields.fields.EncryptedDateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='dbbi',
+            name='nom',
+            field=encrypted_model_fields.fields.EncryptedCharField(),
+        ),
+    ]
@@ -0,0 +1,76 @@
+import datetime
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+BATCH_SIZE = 1000
+
+
+# Frozen copy of myapp.services.blind_index as of this migration
+def _index_key():
+    return hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+
+
+def _normalize_date(value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    parsed = parse_date(str(value)[:10])
+    return parsed.isoformat() if parsed else str(value)
+
+
+def blind_index(nom, date):
+    nom = '' if nom is None else str(nom).strip()
+    message = f"{nom}\x1f{_normalize_date(date)}".encode()
+    return hmac.new(_index_key(), message, hashlib.sha256).hexdigest()
+
+
+def backfill_lookup_key(apps, schema_editor):
+    """
+    Compute the (nom, date) blind index for existing rows. The old
+    get_or_create never matched on ciphertext, so duplicates may exist:
+    the latest row of each (nom, date) is kept, older copies are deleted.
+    """
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    seen = set()
+    duplicates = []
+    batch = []
+
+    for row in Dbbi.objects.filter(lookup_key__isnull=True).order_by('-id').iterator(chunk_size=BATCH_SIZE):
+        key = blind_index(row.nom, row.date)
+        if key in seen:
+            duplicates.append(row.id)
+            continue
+        seen.add(key)
+        row.lookup_key = key
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            Dbbi.objects.bulk_update(batch, ['lookup_key'])
+            batch = []
+
+    if batch:
+        Dbbi.objects.bulk_update(batch, ['lookup_key'])
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        Dbbi.objects.filter(id__in=duplicates[start:start + BATCH_SIZE]).delete()
+    if duplicates:
+        print(f"\n  Deleted {len(duplicates)} older duplicate Dbbi rows (same nom and date)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_dbbi_lookup_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_lookup_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+import encrypted_model_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_backfill_dbbi_lookup_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_key', models.CharField(db_index=True, max_length=64)),
+                ('nom', encrypted_model_fields.fields.EncryptedCharField()),
+                ('day', models.DateField()),
+                ('iso_year', models.PositiveSmallIntegerField()),
+                ('iso_week', models.PositiveSmallIntegerField()),
+                ('iso_weekday', models.PositiveSmallIntegerField()),
+                ('worked_seconds', models.BigIntegerField(default=0)),
+                ('days_present', models.IntegerField(default=0)),
+                ('absences', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['iso_year', 'iso_week'], name='myapp_daily_iso_yea_9432eb_idx')],
+                'unique_together': {('employee_key', 'day')},
+            },
+        ),
+    ]
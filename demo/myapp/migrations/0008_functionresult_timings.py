@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='functionresult',
+            name='cpu_time_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='functionresult',
+            name='peak_memory_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='functionresult',
+            name='wall_time_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_functionresult_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbbi',
+            name='employee_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbbi',
+            name='epoch_day',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='dailyaggregate',
+            index=models.Index(fields=['day'], name='myapp_daily_day_4d2021_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dbbi',
+            index=models.Index(fields=['epoch_day'], name='myapp_dbbi_epoch_d_9893e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dbbi',
+            index=models.Index(fields=['employee_key', 'epoch_day'], name='myapp_dbbi_employe_e86704_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import datetime
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+BATCH_SIZE = 1000
+EPOCH = datetime.date(1970, 1, 1)
+
+
+# Frozen copy of myapp.services.blind_index as of this migration
+def _index_key():
+    return hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+
+
+def _normalize_date(value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    parsed = parse_date(str(value)[:10])
+    return parsed.isoformat() if parsed else str(value)
+
+
+def epoch_day(value):
+    return (datetime.date.fromisoformat(_normalize_date(value)) - EPOCH).days
+
+
+def employee_index(nom):
+    nom = '' if nom is None else str(nom).strip()
+    return hmac.new(_index_key(), nom.encode(), hashlib.sha256).hexdigest()
+
+
+def backfill_period_keys(apps, schema_editor):
+    """Fill epoch_day and employee_key for rows stored before the columns existed"""
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    batch = []
+
+    rows = Dbbi.objects.filter(epoch_day__isnull=True).only('id', 'nom', 'date').order_by('id')
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.epoch_day = epoch_day(row.date)
+        row.employee_key = employee_index(row.nom)
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            Dbbi.objects.bulk_update(batch, ['epoch_day', 'employee_key'])
+            batch = []
+
+    if batch:
+        Dbbi.objects.bulk_update(batch, ['epoch_day', 'employee_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_dbbi_period_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_period_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+# Frozen copy of myapp.services.blind_index.content_hash as of this migration
+def content_hash(*values):
+    key = hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+    message = '\x1f'.join('' if v is None else str(v) for v in values).encode()
+    return hmac.new(key, b'content\x1f' + message, hashlib.sha256).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    """Hash the stored values so the first re-upload does not report every row as changed"""
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    batch = []
+
+    rows = Dbbi.objects.filter(content_hash__isnull=True).only('id', 'entree', 'sortie', 'travail').order_by('id')
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.content_hash = content_hash(row.entree, row.sortie, row.travail)
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            Dbbi.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+
+    if batch:
+        Dbbi.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_incremental_upload'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_backfill_dbbi_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunningTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_key', models.CharField(max_length=64, unique=True)),
+                ('last_day', models.IntegerField()),
+                ('cumulative_seconds', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+import encrypted_model_fields.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_runningtotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbbi',
+            name='entree_seconds',
+            field=encrypted_model_fields.fields.EncryptedIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbbi',
+            name='sortie_seconds',
+            field=encrypted_model_fields.fields.EncryptedIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbbi',
+            name='travail_seconds',
+            field=encrypted_model_fields.fields.EncryptedIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbbi',
+            name='travail_cumulee_seconds',
+            field=encrypted_model_fields.fields.EncryptedBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbbi',
+            name='absent',
+            field=encrypted_model_fields.fields.EncryptedBooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,119 @@
+import datetime
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+# Frozen copies of myapp.services.blind_index / durations as of this migration
+ABSENT = 'Abs'
+_DURATION = re.compile(r'^\s*(?:(-?\d+) days?, )?(-?\d+):(\d{1,2})(?::(\d{1,2}))?\s*$')
+SECONDS_PER_DAY = 86400
+
+
+def content_hash(*values):
+    key = hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+    message = '\x1f'.join('' if v is None else str(v) for v in values).encode()
+    return hmac.new(key, b'content\x1f' + message, hashlib.sha256).hexdigest()
+
+
+def parse_seconds(value):
+    if value is None:
+        return None
+    match = _DURATION.match(str(value))
+    if match is None:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(seconds or 0)
+
+
+def format_clock(seconds):
+    if seconds is None:
+        return None
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+
+def format_cumulative(seconds):
+    if seconds is None:
+        return None
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def typed_fields(record):
+    travail = record.get('Travail')
+    travail_seconds = parse_seconds(travail)
+    if travail_seconds is not None:
+        # Overnight shifts were stored as a negative Sortie - Entrée
+        travail_seconds %= SECONDS_PER_DAY
+    return {
+        'entree_seconds': parse_seconds(record.get('Entrée')),
+        'sortie_seconds': parse_seconds(record.get('Sortie')),
+        'travail_seconds': travail_seconds,
+        'travail_cumulee_seconds': parse_seconds(record.get('Travail Cumulée')),
+        'absent': isinstance(travail, str) and travail.strip() == ABSENT,
+    }
+
+
+def hashed_values(values):
+    return tuple(values[field] for field in ('entree_seconds', 'sortie_seconds', 'travail_seconds', 'absent'))
+
+
+def _batches(Dbbi, fields):
+    """Rows in id order, BATCH_SIZE at a time (keyset, so updating them does not disturb the scan)"""
+    last_id = 0
+    while True:
+        batch = list(Dbbi.objects.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def strings_to_seconds(apps, schema_editor):
+    """
+    Parse the stored HH:MM:SS / 'Abs' strings into the typed columns and hash
+    the typed values, so the first re-upload does not report every row as changed
+    """
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    for batch in _batches(Dbbi, ('entree', 'sortie', 'travail', 'travail_cumulee')):
+        for pk, entree, sortie, travail, travail_cumulee in batch:
+            values = typed_fields({
+                'Entrée': entree,
+                'Sortie': sortie,
+                'Travail': travail,
+                'Travail Cumulée': travail_cumulee,
+            })
+            # One UPDATE per row: bulk_update wraps values in CASE expressions,
+            # which the encrypted fields would encrypt as text
+            Dbbi.objects.filter(pk=pk).update(content_hash=content_hash(*hashed_values(values)), **values)
+
+
+def seconds_to_strings(apps, schema_editor):
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    fields = ('entree_seconds', 'sortie_seconds', 'travail_seconds', 'travail_cumulee_seconds', 'absent')
+    for batch in _batches(Dbbi, fields):
+        for pk, entree, sortie, travail, travail_cumulee, absent in batch:
+            missing = ABSENT if absent else None
+            entree, sortie, travail = (format_clock(value) or missing for value in (entree, sortie, travail))
+            Dbbi.objects.filter(pk=pk).update(
+                entree=entree,
+                sortie=sortie,
+                travail=travail,
+                travail_cumulee=format_cumulative(travail_cumulee),
+                content_hash=content_hash(entree, sortie, travail),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_dbbi_typed_durations'),
+    ]
+
+    operations = [
+        migrations.RunPython(strings_to_seconds, seconds_to_strings),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_backfill_dbbi_typed_durations'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dbbi',
+            name='entree',
+        ),
+        migrations.RemoveField(
+            model_name='dbbi',
+            name='sortie',
+        ),
+        migrations.RemoveField(
+            model_name='dbbi',
+            name='travail',
+        ),
+        migrations.RemoveField(
+            model_name='dbbi',
+            name='travail_cumulee',
+        ),
+    ]
@@ -0,0 +1,56 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+SECONDS_PER_DAY = 86400
+
+
+# Frozen copy of myapp.services.blind_index.content_hash as of this migration
+def content_hash(*values):
+    key = hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+    message = '\x1f'.join('' if v is None else str(v) for v in values).encode()
+    return hmac.new(key, b'content\x1f' + message, hashlib.sha256).hexdigest()
+
+
+def repair_overnight_travail(apps, schema_editor):
+    """
+    0015 could not parse the negative Travail of overnight shifts ('-16:00:00'
+    for 22:00 - 06:00) and stored them as neither worked nor absent. Entrée
+    and Sortie were kept, so the worked time is recomputed from them.
+    Aggregates and cumulative totals are rebuilt by the rebuild_aggregates
+    and recompute_cumulative commands.
+    """
+    Dbbi = apps.get_model('myapp', 'Dbbi')
+    last_id = 0
+    while True:
+        batch = list(
+            Dbbi.objects.filter(id__gt=last_id, travail_seconds__isnull=True)
+            .order_by('id')
+            .values_list('id', 'entree_seconds', 'sortie_seconds', 'absent')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        for pk, entree, sortie, absent in batch:
+            if absent or entree is None or sortie is None:
+                continue
+            travail = (sortie - entree) % SECONDS_PER_DAY
+            # One UPDATE per row: bulk_update would encrypt the CASE expressions as text
+            Dbbi.objects.filter(pk=pk).update(
+                travail_seconds=travail,
+                content_hash=content_hash(entree, sortie, travail, absent),
+            )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_datasetversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(repair_overnight_travail, migrations.RunPython.noop),
+    ]
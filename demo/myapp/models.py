@@ -1,7 +1,12 @@
 from django.db import models
 from django.utils import timezone
+from encrypted_model_fields.fields import EncryptedBigIntegerField
+from encrypted_model_fields.fields import EncryptedBooleanField
 from encrypted_model_fields.fields import EncryptedCharField
 from encrypted_model_fields.fields import EncryptedDateTimeField
+from encrypted_model_fields.fields import EncryptedIntegerField
+from myapp.services.blind_index import blind_index, content_hash, employee_index, epoch_day
+from myapp.services.durations import hashed_values
 
 
 class Dbbi(models.Model):
@@ -15,17 +20,120 @@ class Dbbi(models.Model):
 
     nom = EncryptedCharField(max_length=255)
     date = EncryptedDateTimeField() 
-    entree = EncryptedCharField(max_length=20, blank=True, null=True)  # <-- Add null=True
-    sortie = EncryptedCharField(max_length=20, blank=True, null=True)   # <-- Add null=True
-    travail = EncryptedCharField(max_length=20, blank=True, null=True)   # <-- Add null=True
-    travail_cumulee = EncryptedCharField(max_length=50, blank=True, null=True)  # <-- Add null=True
+    # Durations in seconds, shown as HH:MM:SS by DbbiSerializer
+    entree_seconds = EncryptedIntegerField(blank=True, null=True)  # since midnight
+    sortie_seconds = EncryptedIntegerField(blank=True, null=True)  # since midnight
+    travail_seconds = EncryptedIntegerField(blank=True, null=True)  # worked, null when absent
+    travail_cumulee_seconds = EncryptedBigIntegerField(blank=True, null=True)
+    absent = EncryptedBooleanField(default=False)  # 'Abs' in the source file
+    # HMAC of (nom, date), lets us find a row without decrypting the table
+    lookup_key = models.CharField(max_length=64, unique=True, blank=True, null=True, editable=False)
+    # Plaintext keys for period / employee filtering in SQL
+    epoch_day = models.IntegerField(blank=True, null=True, editable=False)  # days since 1970-01-01
+    employee_key = models.CharField(max_length=64, blank=True, null=True, editable=False)  # HMAC of nom
+    # HMAC of the entry / exit / worked values, unchanged rows are skipped on re-upload
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
     
     class Meta:
         unique_together = ['nom', 'date']
+        indexes = [
+            models.Index(fields=['epoch_day']),
+            models.Index(fields=['employee_key', 'epoch_day']),
+        ]
     
+    def save(self, *args, **kwargs):
+        self.lookup_key = blind_index(self.nom, self.date)
+        self.epoch_day = epoch_day(self.date)
+        self.employee_key = employee_index(self.nom)
+        self.content_hash = content_hash(*hashed_values(self))
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nom} - {self.date}"
 
+class DailyAggregate(models.Model):
+    """Per-employee, per-day totals maintained at ingest time (plain integers)"""
+    employee_key = models.CharField(max_length=64, db_index=True)  # HMAC of nom
+    nom = EncryptedCharField(max_length=255)
+    day = models.DateField()
+    iso_year = models.PositiveSmallIntegerField()
+    iso_week = models.PositiveSmallIntegerField()
+    iso_weekday = models.PositiveSmallIntegerField()  # 1 = Monday
+    worked_seconds = models.BigIntegerField(default=0)
+    days_present = models.IntegerField(default=0)
+    absences = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['employee_key', 'day']
+        indexes = [
+            models.Index(fields=['iso_year', 'iso_week']),
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.nom} - {self.day}"
+
+class RunningTotal(models.Model):
+    """Per-employee running total of worked seconds up to the latest stored day"""
+    employee_key = models.CharField(max_length=64, unique=True)  # HMAC of nom
+    last_day = models.IntegerField()  # epoch day of the latest row
+    cumulative_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.employee_key[:12]} - {self.cumulative_seconds}s"
+
+class DatasetVersion(models.Model):
+    """Single row: version of the Dbbi data the KPI caches are keyed on, shared by every worker process"""
+    version = models.BigIntegerField()
+    modified = models.FloatField()  # Unix time of the last bump
+
+    def __str__(self):
+        return f"v{self.version}"
+
+class IngestionJob(models.Model):
+    """Background Excel upload, processed by the local ingestion worker pool"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    rows_parsed = models.IntegerField(default=0)
+    rows_saved = models.IntegerField(default=0)
+    saved_records = models.IntegerField(default=0)
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    fingerprint = models.CharField(max_length=64, blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} - {self.status}"
+
+class IngestedFile(models.Model):
+    """Fingerprint of a fully ingested upload, the same file sent again is not parsed"""
+    fingerprint = models.CharField(max_length=64, unique=True)  # SHA-256 of the file bytes
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField(default=0)
+    rows = models.IntegerField(default=0)
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_name} - {self.fingerprint[:12]}"
+
 class FunctionResult(models.Model):
     function_name = models.CharField(max_length=255)
     arguments = models.TextField(blank=True, null=True)
@@ -34,6 +142,9 @@ class FunctionResult(models.Model):
     error_message = models.TextField(blank=True, null=True)
     executed_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
+    wall_time_ms = models.FloatField(blank=True, null=True)
+    cpu_time_ms = models.FloatField(blank=True, null=True)
+    peak_memory_bytes = models.BigIntegerField(blank=True, null=True)
     
     class Meta:
         ordering = ['-executed_at']
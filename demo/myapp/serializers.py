@@ -1,8 +1,88 @@
+from collections.abc import Mapping
+
 from rest_framework import serializers
 from .models import Dbbi
+from .services.durations import ABSENT, format_clock, format_cumulative, is_absent, parse_seconds
+
+
+class DurationField(serializers.Field):
+    """
+    A typed seconds column of Dbbi shown as the HH:MM:SS string the API has
+    always returned, 'Abs' for absent rows. The same strings are accepted on
+    write. Reads the whole row (source='*') since 'Abs' comes from `absent`.
+    """
+    default_error_messages = {'invalid': "Expected HH:MM:SS, HH:MM or 'Abs'."}
+
+    def __init__(self, seconds_field, format=format_clock, shows_absent=True, sets_absent=False, **kwargs):
+        self.seconds_field = seconds_field
+        self.format = format
+        self.shows_absent = shows_absent
+        self.sets_absent = sets_absent
+        super().__init__(source='*', required=False, allow_null=True, **kwargs)
+
+    def validate_empty_values(self, data):
+        # null clears the column; with source='*' to_internal_value must build that dict
+        if data is None:
+            return False, data
+        return super().validate_empty_values(data)
+
+    @staticmethod
+    def _value(row, field):
+        # Model instances, or dicts from projection.records()
+        return row.get(field) if isinstance(row, Mapping) else getattr(row, field)
+
+    def to_representation(self, row):
+        seconds = self._value(row, self.seconds_field)
+        if seconds is not None:
+            return self.format(seconds)
+        return ABSENT if self.shows_absent and self._value(row, 'absent') else None
+
+    def to_internal_value(self, data):
+        absent = is_absent(data)
+        if absent or data in (None, ''):
+            seconds = None
+        else:
+            seconds = parse_seconds(data)
+            if seconds is None or seconds < 0:
+                self.fail('invalid')
+
+        values = {self.seconds_field: seconds}
+        if self.sets_absent:
+            values['absent'] = absent
+        return values
 
 
 class DbbiSerializer(serializers.ModelSerializer):
+    entree = DurationField('entree_seconds')
+    sortie = DurationField('sortie_seconds')
+    travail = DurationField('travail_seconds', sets_absent=True)
+    travail_cumulee = DurationField('travail_cumulee_seconds', format=format_cumulative, shows_absent=False)
+
+    # Model columns each API field is built from
+    SOURCES = {
+        'entree': ('entree_seconds', 'absent'),
+        'sortie': ('sortie_seconds', 'absent'),
+        'travail': ('travail_seconds', 'absent'),
+        'travail_cumulee': ('travail_cumulee_seconds',),
+    }
+
     class Meta:
         model = Dbbi
         fields = ['id', 'nom', 'date', 'entree', 'sortie', 'travail', 'travail_cumulee']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """fields: optional subset of Meta.fields to output"""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def source_fields(cls, fields):
+        """Model columns to fetch (only() / projection.rows()) to output these fields"""
+        columns = []
+        for name in fields:
+            for column in cls.SOURCES.get(name, (name,)):
+                if column not in columns:
+                    columns.append(column)
+        return columns
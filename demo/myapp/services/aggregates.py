@@ -0,0 +1,139 @@
+import datetime
+
+from django.db import transaction
+
+from myapp.models import DailyAggregate
+from myapp.services import kpi_cache, projection
+from myapp.services.blind_index import employee_index, normalize_date
+from myapp.services.durations import is_absent, parse_seconds
+
+# Dbbi columns the aggregates are computed from
+ROW_FIELDS = ('nom', 'date', 'travail_seconds', 'absent')
+
+
+def _day(value):
+    return datetime.date.fromisoformat(normalize_date(value))
+
+
+def _group_rows(rows):
+    """Sum (nom, date, travail_seconds, absent) rows per (employee_key, day)"""
+    groups = {}
+    for nom, date, worked, absent in rows:
+        if date is None:
+            continue
+        day = _day(date)
+        key = (employee_index(nom), day)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'nom': nom, 'worked': 0, 'present': 0, 'absent': 0}
+
+        if worked is not None:
+            group['worked'] += worked
+            group['present'] += 1
+        elif absent:
+            group['absent'] += 1
+    return groups
+
+
+def _record_rows(records):
+    for record in records:
+        travail = record.get('Travail')
+        yield record['Nom'], record.get('Date'), parse_seconds(travail), is_absent(travail)
+
+
+def apply_records(records):
+    """
+    Add newly stored records (parsed {'Nom', 'Date', 'Travail'} dicts) to the
+    daily aggregates. Must run in the transaction that inserts the records
+    so both stay consistent.
+    """
+    return _apply(_group_rows(_record_rows(records)), 1)
+
+
+def apply_rows(rows):
+    """Add the stored values (ROW_FIELDS tuples) of Dbbi rows written one by one"""
+    return _apply(_group_rows(rows), 1)
+
+
+def retract_rows(rows):
+    """Remove the stored values (ROW_FIELDS tuples) of Dbbi rows that are about to be updated"""
+    return _apply(_group_rows(rows), -1)
+
+
+def _new_aggregate(key, day, group, sign=1):
+    iso = day.isocalendar()
+    return DailyAggregate(
+        employee_key=key,
+        nom=group['nom'],
+        day=day,
+        iso_year=iso[0],
+        iso_week=iso[1],
+        iso_weekday=iso[2],
+        worked_seconds=sign * group['worked'],
+        days_present=sign * group['present'],
+        absences=sign * group['absent'],
+    )
+
+
+def _apply(groups, sign):
+    if not groups:
+        return 0
+
+    with transaction.atomic():
+        existing = {
+            (agg.employee_key, agg.day): agg
+            for agg in DailyAggregate.objects.select_for_update().filter(
+                employee_key__in={key for key, _ in groups},
+                day__in={day for _, day in groups},
+            )
+        }
+
+        to_update = []
+        to_create = []
+        emptied = []
+        for (key, day), group in groups.items():
+            agg = existing.get((key, day))
+            if agg is None:
+                to_create.append(_new_aggregate(key, day, group, sign))
+                continue
+            agg.worked_seconds += sign * group['worked']
+            agg.days_present += sign * group['present']
+            agg.absences += sign * group['absent']
+            if agg.worked_seconds or agg.days_present or agg.absences:
+                to_update.append(agg)
+            else:
+                # Every row of that day was retracted (deleted or moved)
+                emptied.append(agg.pk)
+
+        DailyAggregate.objects.bulk_create(to_create)
+        DailyAggregate.objects.bulk_update(to_update, ['worked_seconds', 'days_present', 'absences'])
+        DailyAggregate.objects.filter(pk__in=emptied).delete()
+    return len(groups)
+
+
+def rebuild(chunk_size=2000, groups=None):
+    """
+    Recompute every aggregate from the Dbbi table (decrypts it once).
+    groups: totals already computed by parallel_scan.parallel_daily_groups(),
+    stored as they are instead of scanning the table here.
+    """
+    with transaction.atomic():
+        DailyAggregate.objects.all().delete()
+        if groups is not None:
+            DailyAggregate.objects.bulk_create(
+                [_new_aggregate(key, day, group) for (key, day), group in groups.items()],
+                batch_size=chunk_size,
+            )
+            transaction.on_commit(kpi_cache.bump_version)
+            return len(groups)
+
+        batch = []
+        for row in projection.rows(ROW_FIELDS, chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                _apply(_group_rows(batch), 1)
+                batch = []
+        _apply(_group_rows(batch), 1)
+        transaction.on_commit(kpi_cache.bump_version)
+    return DailyAggregate.objects.count()
+
@@ -0,0 +1,259 @@
+"""
+Parquet archive of the Dbbi rows: decrypted, typed columns partitioned by
+month (ARCHIVE_DIR/year=2024/month=03/*.parquet), so bulk analytics read
+only the months and columns they need instead of decrypting the table.
+
+Files use Parquet modular encryption (columns and footer). Their data keys
+are wrapped with the FIELD_ENCRYPTION_KEY MultiFernet, the key material of
+the encrypted fields.
+
+Every bulk_save appends the rows it wrote as a new file of their month,
+readers keep the last version of each (nom, date). Rows edited or deleted
+through the API or the admin only reach the archive with rebuild()
+(manage.py rebuild_archive), which also compacts each month to one file.
+'Travail Cumulée' is not archived: backfills rewrite it on rows a batch
+does not contain.
+"""
+import datetime
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.parquet.encryption as pe
+from django.conf import settings
+from encrypted_model_fields.fields import get_crypter
+
+from myapp.models import Dbbi
+from myapp.services.blind_index import EPOCH, employee_index, normalize_date, normalize_nom
+from myapp.services.durations import typed_fields
+
+SCHEMA = pa.schema([
+    ('lookup_key', pa.string()),
+    ('employee_key', pa.string()),
+    ('nom', pa.string()),
+    ('day', pa.date32()),
+    ('entree_seconds', pa.int32()),
+    ('sortie_seconds', pa.int32()),
+    ('travail_seconds', pa.int32()),
+    ('absent', pa.bool_()),
+])
+COLUMNS = tuple(SCHEMA.names)
+
+# Dbbi columns the archive is built from, in SCHEMA order ('day' from epoch_day)
+_DB_FIELDS = (
+    'lookup_key', 'employee_key', 'nom', 'epoch_day', 'entree_seconds', 'sortie_seconds', 'travail_seconds', 'absent',
+)
+_MASTER_KEY = 'field_encryption_key'
+
+
+class _FernetKms(pe.KmsClient):
+    """Wraps the files' data keys with FIELD_ENCRYPTION_KEY, read at call time"""
+
+    def __init__(self, config):
+        super().__init__()
+
+    def wrap_key(self, key_bytes, master_key_identifier):
+        return get_crypter().encrypt(key_bytes).decode()
+
+    def unwrap_key(self, wrapped_key, master_key_identifier):
+        return get_crypter().decrypt(wrapped_key.encode())
+
+
+_crypto = pe.CryptoFactory(_FernetKms)
+_kms = pe.KmsConnectionConfig()
+
+
+def _encryption():
+    config = pe.EncryptionConfiguration(footer_key=_MASTER_KEY, uniform_encryption=True, double_wrapping=False)
+    return _crypto.file_encryption_properties(_kms, config)
+
+
+def _decryption():
+    return _crypto.file_decryption_properties(_kms, pe.DecryptionConfiguration())
+
+
+def _month_dir(root, year, month):
+    return os.path.join(root, f'year={year}', f'month={month:02d}')
+
+
+def _write(root, year, month, columns):
+    """One new part file of a month from {column: list}; written aside then renamed"""
+    directory = _month_dir(root, year, month)
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet'
+    tmp = os.path.join(directory, f'.{name}.tmp')
+    pq.write_table(pa.table(columns, schema=SCHEMA), tmp, encryption_properties=_encryption())
+    os.replace(tmp, os.path.join(directory, name))
+    return len(columns['lookup_key'])
+
+
+def _columns(rows):
+    """{column: list} of SCHEMA-ordered tuples"""
+    return dict(zip(COLUMNS, map(list, zip(*rows))))
+
+
+def _by_month(rows):
+    """{(year, month): {column: list}} of SCHEMA-ordered tuples"""
+    months = {}
+    for row in rows:
+        months.setdefault((row[3].year, row[3].month), []).append(row)
+    return {month: _columns(month_rows) for month, month_rows in months.items()}
+
+
+def append_records(records):
+    """
+    Archive records bulk_save has just committed ({lookup_key: parsed
+    record}), one new file per month. Returns the number of rows written.
+    """
+    rows = []
+    for key, record in records.items():
+        typed = typed_fields(record)
+        rows.append((
+            key,
+            employee_index(record['Nom']),
+            normalize_nom(record['Nom']),
+            datetime.date.fromisoformat(normalize_date(record['Date'])),
+            typed['entree_seconds'],
+            typed['sortie_seconds'],
+            typed['travail_seconds'],
+            typed['absent'],
+        ))
+    root = settings.ARCHIVE_DIR
+    return sum(_write(root, year, month, columns) for (year, month), columns in _by_month(rows).items())
+
+
+def rebuild(chunk_size=2000):
+    """
+    Rewrite the whole archive from the Dbbi table, one file per month,
+    decrypting one month at a time (rows in epoch_day order). Built in a
+    sibling directory that then replaces ARCHIVE_DIR.
+    Returns (rows, months).
+    """
+    root = os.path.normpath(settings.ARCHIVE_DIR)
+    building = f'{root}.building'
+    shutil.rmtree(building, ignore_errors=True)
+
+    queryset = Dbbi.objects.filter(epoch_day__isnull=False).order_by('epoch_day', 'id')
+    rows = 0
+    months = 0
+    current = None
+    batch = []
+    for values in queryset.values_list(*_DB_FIELDS).iterator(chunk_size=chunk_size):
+        day = EPOCH + datetime.timedelta(days=values[3])
+        if (day.year, day.month) != current:
+            if batch:
+                rows += _write(building, *current, _columns(batch))
+                months += 1
+            current = (day.year, day.month)
+            batch = []
+        batch.append((*values[:2], normalize_nom(values[2]), day, *values[4:]))
+    if batch:
+        rows += _write(building, *current, _columns(batch))
+        months += 1
+
+    os.makedirs(building, exist_ok=True)
+    previous = f'{root}.previous'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.isdir(root):
+        os.rename(root, previous)
+    os.rename(building, root)
+    shutil.rmtree(previous, ignore_errors=True)
+    return rows, months
+
+
+def _months(start=None, end=None):
+    """Month directories of the archive within [start, end], oldest first"""
+    root = settings.ARCHIVE_DIR
+    if not os.path.isdir(root):
+        return []
+    first = (start.year, start.month) if start else None
+    last = (end.year, end.month) if end else None
+    found = []
+    for year_dir in os.listdir(root):
+        if not year_dir.startswith('year='):
+            continue
+        for month_dir in os.listdir(os.path.join(root, year_dir)):
+            if not month_dir.startswith('month='):
+                continue
+            month = (int(year_dir[5:]), int(month_dir[6:]))
+            if (first and month < first) or (last and month > last):
+                continue
+            found.append((month, os.path.join(root, year_dir, month_dir)))
+    return [directory for _, directory in sorted(found)]
+
+
+def read(columns=COLUMNS, start=None, end=None):
+    """
+    DataFrame of the archived rows, the last version of each (nom, date).
+    Only `columns` are read and decrypted, and only the months within
+    [start, end] (dates, inclusive).
+    """
+    columns = list(columns)
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown archive columns: {unknown}. Available: {list(COLUMNS)}")
+    needed = list(dict.fromkeys(['lookup_key', 'day', *columns]))
+
+    decryption = _decryption()
+    tables = []
+    for directory in _months(start, end):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.parquet'):
+                tables.append(pq.read_table(
+                    os.path.join(directory, name), columns=needed, decryption_properties=decryption,
+                ))
+    table = pa.concat_tables(tables) if tables else SCHEMA.empty_table().select(needed)
+    # Nullable integers stay integers (pd.NA) instead of floats with NaN
+    frame = table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get)
+    # Files are read oldest first, so the last row of a key is its latest version
+    frame = frame.drop_duplicates('lookup_key', keep='last')
+    if start is not None:
+        frame = frame[frame['day'] >= start]
+    if end is not None:
+        frame = frame[frame['day'] <= end]
+    return frame[columns].reset_index(drop=True)
+
+
+def daily_groups(start=None, end=None):
+    """
+    Per (employee_key, day) totals of the archive, in the shape of
+    aggregates._group_rows(), for aggregates.rebuild(groups=...)
+    """
+    frame = read(('employee_key', 'nom', 'day', 'travail_seconds', 'absent'), start, end)
+    frame['present'] = frame['travail_seconds'].notna()
+    frame['absent'] = frame['absent'] & ~frame['present']
+    frame['worked'] = frame['travail_seconds'].fillna(0).astype(np.int64)
+    totals = frame.groupby(['employee_key', 'day'], sort=False).agg(
+        nom=('nom', 'first'), worked=('worked', 'sum'), present=('present', 'sum'), absent=('absent', 'sum'),
+    )
+    return {
+        key: {'nom': nom, 'worked': int(worked), 'present': int(present), 'absent': int(absent)}
+        for key, nom, worked, present, absent in totals.itertuples(name=None)
+    }
+
+
+def build_snapshot():
+    """snapshot.DbbiSnapshot of the archive, without touching the Dbbi table"""
+    from myapp.services import snapshot
+
+    start = time.perf_counter()
+    frame = read(('nom', 'day', 'travail_seconds', 'absent'))
+
+    codes, uniques = pd.factorize(frame['nom'])
+    present = frame['travail_seconds'].notna().to_numpy()
+    flags = np.where(present, snapshot.WORKED, np.where(frame['absent'].to_numpy(), snapshot.ABSENT, 0))
+    days = (pd.to_datetime(frame['day']) - pd.Timestamp(EPOCH)).dt.days
+    return snapshot.DbbiSnapshot(
+        [sys.intern(nom) for nom in uniques],
+        codes.astype(np.int32),
+        days.to_numpy(dtype=np.int32),
+        frame['travail_seconds'].fillna(0).to_numpy(dtype=np.int32),
+        flags.astype(np.uint8),
+        time.perf_counter() - start,
+    )
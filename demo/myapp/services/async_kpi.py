@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from myapp.services.kpi import build_kpis, employee_names, grouped_rows
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Bounded pool for the CPU-bound KPI work and concurrent aggregate queries"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_KPI_WORKERS,
+                thread_name_prefix='async-kpi',
+            )
+    return _executor
+
+
+def _fetch(queryset, collect):
+    """
+    Run a query on the pool thread's own connection. Pool threads live outside
+    the request cycle, so they apply its connection housekeeping themselves:
+    a connection past CONN_MAX_AGE or left unusable by an error is closed
+    before and after the query, any other stays open for the next request (at
+    most ASYNC_KPI_WORKERS of them).
+    """
+    close_old_connections()
+    try:
+        return collect(queryset)
+    finally:
+        close_old_connections()
+
+
+async def _in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor(), func, *args)
+
+
+async def acompute_kpis(period=None, concurrent=False):
+    """
+    Async compute_kpis. Rows come from async ORM iteration, or with
+    concurrent=True from two queries run at the same time on separate pool
+    connections. Building the arrays runs on the bounded executor so the
+    event loop is never blocked.
+    """
+    if concurrent:
+        rows, names = await asyncio.gather(
+            _in_executor(_fetch, grouped_rows(period), list),
+            _in_executor(_fetch, employee_names(period), dict),
+        )
+    else:
+        rows = [row async for row in grouped_rows(period)]
+        names = {key: nom async for key, nom in employee_names(period)}
+    return await _in_executor(build_kpis, rows, names)
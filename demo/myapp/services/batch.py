@@ -0,0 +1,286 @@
+"""
+Batch uploads: several workbooks and / or zip archives of workbooks at once,
+every sheet of every workbook. Workbooks are parsed in a process pool, the
+rows are merged and saved with a single bulk_save (and cumulative) pass.
+"""
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+import pandas as pd
+from django.conf import settings
+
+from myapp.services import metrics
+from myapp.services.blind_index import blind_index
+from myapp.services.myapp import OUTPUT_COLUMNS, compute_cumulative, extract_attendance, validate_columns
+from myapp.services.persistence import SaveReport, bulk_save, find_ingested, record_ingested
+
+logger = logging.getLogger(__name__)
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class BatchError(Exception):
+    """The whole batch is refused (too many workbooks, too many bytes)"""
+
+
+class BatchFile:
+    """One workbook of a batch (an upload or a zip member) and its report"""
+
+    PENDING = 'pending'
+    PARSED = 'parsed'
+    ALREADY_INGESTED = 'already_ingested'
+    DUPLICATE = 'duplicate'
+    ERROR = 'error'
+
+    def __init__(self, name, content=None, error=None):
+        self.name = name
+        self.content = content
+        self.size = len(content) if content is not None else 0
+        self.fingerprint = hashlib.sha256(content).hexdigest() if content is not None else None
+        self.status = self.ERROR if error else self.PENDING
+        self.error = error
+        self.sheets = []
+        self.frame = None
+        self.report = SaveReport()
+        self.ingested_at = None
+
+    @property
+    def rows(self):
+        return sum(sheet.get('rows', 0) for sheet in self.sheets)
+
+    def fail(self, error):
+        self.status = self.ERROR
+        self.error = error
+        self.content = None
+
+    def as_dict(self):
+        result = {
+            'file_name': self.name,
+            'status': self.status,
+            'sheets': self.sheets,
+            'total_records': self.rows,
+            'saved_records': self.report.saved,
+            **self.report.as_dict(),
+        }
+        if self.error:
+            result['error'] = self.error
+        if self.ingested_at:
+            result['already_ingested_at'] = self.ingested_at
+        return result
+
+
+def _add(files, batch_file, total_bytes):
+    workbooks = sum(1 for f in files if f.status == BatchFile.PENDING) + 1
+    if workbooks > settings.BATCH_MAX_FILES:
+        raise BatchError(f"Too many workbooks in one batch (max {settings.BATCH_MAX_FILES})")
+    if total_bytes > settings.BATCH_MAX_BYTES:
+        raise BatchError(f"Batch too large (max {settings.BATCH_MAX_BYTES} bytes of workbooks)")
+    files.append(batch_file)
+
+
+def collect(uploads):
+    """BatchFile of every workbook in the uploaded files, zip archives are expanded"""
+    files = []
+    total_bytes = 0
+    for upload in uploads:
+        name = os.path.basename(upload.name)
+        if name.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload)
+            except zipfile.BadZipFile as e:
+                files.append(BatchFile(name, error=f"Invalid zip archive: {e}"))
+                continue
+            with archive:
+                for info in archive.infolist():
+                    member = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or member.startswith(('~$', '.')):
+                        continue
+                    label = f"{name}/{info.filename}"
+                    if not member.lower().endswith(EXCEL_EXTENSIONS):
+                        files.append(BatchFile(label, error='Not an Excel file (.xlsx or .xls)'))
+                        continue
+                    # Checked on the declared size before anything is inflated
+                    total_bytes += info.file_size
+                    _add(files, BatchFile(label, archive.read(info)), total_bytes)
+        elif name.lower().endswith(EXCEL_EXTENSIONS):
+            content = upload.read()
+            total_bytes += len(content)
+            _add(files, BatchFile(name, content), total_bytes)
+        else:
+            files.append(BatchFile(name, error='File must be in Excel format (.xlsx or .xls) or a .zip of them'))
+    return files
+
+
+def parse_workbook(name, content):
+    """
+    Worker: every sheet of one workbook. Returns (frame, sheets): the
+    extracted rows of the sheets that have the required columns (no
+    'Travail Cumulée' yet, that is computed on the merged batch) and
+    [{'sheet', 'rows'} or {'sheet', 'error'}] for each sheet.
+    """
+    engine = 'xlrd' if name.lower().endswith('.xls') else 'openpyxl'
+    workbook = pd.read_excel(io.BytesIO(content), sheet_name=None, engine=engine)
+
+    frames = []
+    sheets = []
+    for sheet, df in workbook.items():
+        try:
+            validate_columns(df.columns)
+        except ValueError as e:
+            sheets.append({'sheet': sheet, 'error': str(e)})
+            continue
+        extracted = extract_attendance(df)
+        frames.append(extracted)
+        sheets.append({'sheet': sheet, 'rows': len(extracted)})
+    return (pd.concat(frames, ignore_index=True) if frames else None), sheets
+
+
+def _parse_pool(workers):
+    """
+    Process pool shared by every batch of this process, sized on first use.
+    Workers are spawned, not forked: forking a threaded web process (audit
+    writer, ingestion pool) could copy locks held by those threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _pool
+
+
+def _reset_pool(pool):
+    """Drop a broken pool (a worker died) so the next batch starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_files(files, workers=None):
+    """Parse the pending BatchFiles, up to `workers` workbooks at once in separate processes"""
+    workers = workers or settings.BATCH_PARSE_WORKERS
+    pending = [f for f in files if f.status == BatchFile.PENDING]
+
+    if workers <= 1 or len(pending) <= 1:
+        def results():
+            for batch_file in pending:
+                try:
+                    yield parse_workbook(batch_file.name, batch_file.content)
+                except Exception as e:
+                    yield e
+        _collect_results(pending, results())
+        return
+
+    pool = _parse_pool(workers)
+    try:
+        futures = [pool.submit(parse_workbook, f.name, f.content) for f in pending]
+        results = [future.exception() or future.result() for future in futures]
+    except BrokenProcessPool as e:
+        results = [e] * len(pending)
+    if any(isinstance(result, BrokenProcessPool) for result in results):
+        _reset_pool(pool)
+    _collect_results(pending, results)
+
+
+def _collect_results(pending, results):
+    for batch_file, result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.warning("Error reading %s: %s", batch_file.name, result)
+            batch_file.fail(f"Cannot read Excel file: {result}")
+            continue
+        batch_file.frame, batch_file.sheets = result
+        if batch_file.frame is None:
+            batch_file.fail('No sheet with the required columns')
+        else:
+            batch_file.status = BatchFile.PARSED
+            batch_file.content = None
+
+
+def _lookup_key(record):
+    """bulk_save's key for a record, None for the records it rejects"""
+    if pd.isna(record.get('Nom')) or pd.isna(record.get('Date')):
+        return None
+    try:
+        return blind_index(record['Nom'], record['Date'])
+    except Exception:
+        return None
+
+
+def ingest(uploads, force=False, workers=None):
+    """
+    Parse and save a batch of uploads. Workbooks already ingested (same
+    bytes) are skipped unless force. All parsed rows are merged, sorted and
+    saved with one bulk_save call, then counted back to the workbook they
+    came from (a (nom, date) present in several workbooks counts for the
+    first one, as skipped for the others).
+    Returns (files, report): the BatchFiles and the batch SaveReport.
+    """
+    files = collect(uploads)
+
+    seen = set()
+    for batch_file in files:
+        if batch_file.status != BatchFile.PENDING:
+            continue
+        if batch_file.fingerprint in seen:
+            batch_file.status = BatchFile.DUPLICATE
+            batch_file.content = None
+            continue
+        seen.add(batch_file.fingerprint)
+        previous = None if force else find_ingested(batch_file.fingerprint)
+        if previous:
+            batch_file.status = BatchFile.ALREADY_INGESTED
+            batch_file.ingested_at = previous.created_at
+            batch_file.report.skipped = previous.rows
+            batch_file.content = None
+
+    with metrics.ingestion_stage_seconds.time(stage='read'):
+        parse_files(files, workers)
+
+    parsed = [f for f in files if f.status == BatchFile.PARSED]
+    report = SaveReport()
+    if parsed:
+        with metrics.ingestion_stage_seconds.time(stage='compute'):
+            merged = pd.concat(
+                [f.frame.assign(_file=index) for index, f in enumerate(parsed)], ignore_index=True,
+            )
+            merged = compute_cumulative(merged)
+            records = merged[OUTPUT_COLUMNS].to_dict('records')
+            sources = merged['_file'].to_numpy()
+        metrics.rows_parsed.inc(len(records), path='batch')
+
+        outcomes = {}
+        with metrics.ingestion_stage_seconds.time(stage='persist'):
+            report = bulk_save(records, outcomes=outcomes)
+
+        claimed = set()
+        for record, index in zip(records, sources):
+            counts = parsed[index].report
+            key = _lookup_key(record)
+            if key is None or key in claimed:
+                counts.skipped += 1
+                continue
+            claimed.add(key)
+            result = outcomes.get(key, 'skipped')
+            setattr(counts, result, getattr(counts, result) + 1)
+
+    for batch_file in files:
+        batch_file.frame = None
+        if batch_file.status == BatchFile.PARSED:
+            record_ingested(batch_file.fingerprint, batch_file.name, batch_file.size, batch_file.rows, batch_file.report)
+    return files, report
@@ -0,0 +1,61 @@
+import datetime
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def _index_key():
+    """Sub-key derived from BLIND_INDEX_KEY so the raw setting is never used directly"""
+    return hmac.new(settings.BLIND_INDEX_KEY.encode(), b'dbbi-blind-index', hashlib.sha256).digest()
+
+
+def normalize_nom(nom):
+    return '' if nom is None else str(nom).strip()
+
+
+def normalize_date(value):
+    """Return the ISO day (YYYY-MM-DD) for a date, datetime or date string"""
+    if value is None or value == '':
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    parsed = parse_date(str(value)[:10])
+    return parsed.isoformat() if parsed else str(value)
+
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def epoch_day(value):
+    """
+    Days since 1970-01-01 of a date, datetime or date string. Stored in clear
+    next to the encrypted date so periods can be range-queried and indexed.
+    """
+    return (datetime.date.fromisoformat(normalize_date(value)) - EPOCH).days
+
+
+def blind_index(nom, date):
+    """
+    Keyed HMAC of (nom, date). Encrypted fields cannot be looked up or indexed
+    because the ciphertext changes on every save, this digest is deterministic.
+    """
+    message = f"{normalize_nom(nom)}\x1f{normalize_date(date)}".encode()
+    return hmac.new(_index_key(), message, hashlib.sha256).hexdigest()
+
+
+def employee_index(nom):
+    """Keyed HMAC of nom alone, groups an employee's rows without decrypting them"""
+    return hmac.new(_index_key(), normalize_nom(nom).encode(), hashlib.sha256).hexdigest()
+
+
+def content_hash(*values):
+    """Keyed HMAC of a row's source values, tells a changed re-upload from an identical one"""
+    message = '\x1f'.join('' if v is None else str(v) for v in values).encode()
+    return hmac.new(_index_key(), b'content\x1f' + message, hashlib.sha256).hexdigest()
@@ -0,0 +1,117 @@
+import datetime
+
+from django.db.models import Max, Sum
+
+from myapp.models import DailyAggregate, Dbbi, RunningTotal
+from myapp.services.blind_index import EPOCH, employee_index, epoch_day
+from myapp.services.durations import format_cumulative, parse_seconds
+
+
+def _bootstrap(employee_keys):
+    """
+    RunningTotal rows for employees stored before the index existed, built
+    from the daily aggregates (plain integers, nothing is decrypted)
+    """
+    rows = (
+        DailyAggregate.objects.filter(employee_key__in=employee_keys)
+        .values('employee_key')
+        .annotate(worked=Sum('worked_seconds'), last=Max('day'))
+    )
+    created = [
+        RunningTotal(
+            employee_key=row['employee_key'],
+            last_day=(row['last'] - EPOCH).days,
+            cumulative_seconds=row['worked'] or 0,
+        )
+        for row in rows
+    ]
+    RunningTotal.objects.bulk_create(created)
+    return created
+
+
+def load_totals(employee_keys):
+    """{employee_key: RunningTotal} for these employees, locked for the transaction"""
+    employee_keys = set(employee_keys)
+    totals = {
+        total.employee_key: total
+        for total in RunningTotal.objects.select_for_update().filter(employee_key__in=employee_keys)
+    }
+    missing = employee_keys - set(totals)
+    if missing:
+        totals.update((total.employee_key, total) for total in _bootstrap(missing))
+    return totals
+
+
+def assign(records, new_keys):
+    """
+    Set 'Travail Cumulée' on records about to be written (dicts from
+    build_attendance, keyed by lookup key) from the running-total index.
+    Employees whose new rows all come after their last stored day are
+    continued in O(new rows). For the others (older days, or changed rows)
+    returns {employee_key: first epoch day to recompute} for recompute().
+    """
+    by_employee = {}
+    for key, record in records.items():
+        day = epoch_day(record['Date'])
+        by_employee.setdefault(employee_index(record['Nom']), []).append((day, key))
+
+    totals = load_totals(by_employee)
+    backfills = {}
+    for employee_key, rows in by_employee.items():
+        rows.sort()
+        total = totals.get(employee_key)
+        first_day = rows[0][0]
+        appended = all(key in new_keys for _, key in rows)
+        if not appended or (total is not None and first_day <= total.last_day):
+            backfills[employee_key] = first_day
+            continue
+
+        if total is None:
+            total = RunningTotal(employee_key=employee_key, last_day=first_day, cumulative_seconds=0)
+        for day, key in rows:
+            total.cumulative_seconds += parse_seconds(records[key]['Travail']) or 0
+            total.last_day = day
+            records[key]['Travail Cumulée'] = format_cumulative(total.cumulative_seconds)
+        total.save()
+    return backfills
+
+
+def recompute(employee_key, from_day=None, records=None):
+    """
+    Rewrite travail_cumulee_seconds of one employee's rows from from_day (epoch day)
+    onwards. The total before from_day comes from the daily aggregates, so
+    only the affected rows are decrypted. records ({lookup_key: record}) get
+    the recomputed values too. Returns the number of rows rewritten.
+    """
+    before = DailyAggregate.objects.filter(employee_key=employee_key)
+    if from_day is None:
+        cumul = 0
+    else:
+        before = before.filter(day__lt=EPOCH + datetime.timedelta(days=from_day))
+        cumul = before.aggregate(worked=Sum('worked_seconds'))['worked'] or 0
+
+    rows = Dbbi.objects.filter(employee_key=employee_key)
+    if from_day is not None:
+        rows = rows.filter(epoch_day__gte=from_day)
+    rows = rows.order_by('epoch_day').values_list(
+        'id', 'lookup_key', 'epoch_day', 'travail_seconds', 'travail_cumulee_seconds',
+    )
+
+    rewritten = 0
+    last_day = from_day
+    for pk, lookup_key, day, worked, stored in rows:
+        cumul += worked or 0
+        last_day = day
+        if records and lookup_key in records:
+            records[lookup_key]['Travail Cumulée'] = format_cumulative(cumul)
+        if cumul != stored:
+            # Per-row UPDATE, see persistence._update_changed
+            Dbbi.objects.filter(pk=pk).update(travail_cumulee_seconds=cumul)
+            rewritten += 1
+
+    if last_day is not None:
+        RunningTotal.objects.update_or_create(
+            employee_key=employee_key,
+            defaults={'last_day': last_day, 'cumulative_seconds': cumul},
+        )
+    return rewritten
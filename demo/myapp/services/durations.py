@@ -0,0 +1,66 @@
+import datetime
+import re
+
+ABSENT = 'Abs'
+
+# Typed Dbbi columns covered by the content hash, in hashing order
+HASHED_FIELDS = ('entree_seconds', 'sortie_seconds', 'travail_seconds', 'absent')
+
+# The sign applies to the days / hours only, as in str(timedelta) ('-1 day, 8:00:00')
+# and in the floor-divided HH:MM:SS of overnight shifts ('-16:00:00')
+_DURATION = re.compile(r'^\s*(?:(-?\d+) days?, )?(-?\d+):(\d{1,2})(?::(\d{1,2}))?\s*$')
+
+
+def parse_seconds(value):
+    """
+    Seconds in an 'HH:MM:SS' or 'HH:MM' value, or a str(timedelta) such as
+    '2 days, 3:15:00' (the 'Travail Cumulée' format). Negative values parse
+    to negative seconds. None for 'Abs', empty or invalid values.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, datetime.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    match = _DURATION.match(str(value))
+    if match is None:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(seconds or 0)
+
+
+def is_absent(travail):
+    return isinstance(travail, str) and travail.strip() == ABSENT
+
+
+def format_clock(seconds):
+    """HH:MM:SS of a time of day or a worked duration in seconds, None stays None"""
+    if seconds is None:
+        return None
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+
+def format_cumulative(seconds):
+    """Same format as the parsed 'Travail Cumulée' column (str of a timedelta)"""
+    if seconds is None:
+        return None
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def typed_fields(record):
+    """Typed Dbbi field values of a parsed record ('Entrée', 'Sortie', 'Travail', 'Travail Cumulée')"""
+    return {
+        'entree_seconds': parse_seconds(record.get('Entrée')),
+        'sortie_seconds': parse_seconds(record.get('Sortie')),
+        'travail_seconds': parse_seconds(record.get('Travail')),
+        'travail_cumulee_seconds': parse_seconds(record.get('Travail Cumulée')),
+        'absent': is_absent(record.get('Travail')),
+    }
+
+
+def hashed_values(values):
+    """The HASHED_FIELDS of typed field values (a dict or a Dbbi instance), for content_hash()"""
+    if isinstance(values, dict):
+        return tuple(values.get(field) for field in HASHED_FIELDS)
+    return tuple(getattr(values, field) for field in HASHED_FIELDS)
@@ -0,0 +1,128 @@
+"""
+CSV / XLSX exports of the Dbbi rows and of the per-employee KPI table.
+Rows are decrypted chunk by chunk (projection.rows, i.e. iterator()) and
+written out as they come, memory does not grow with the period exported.
+"""
+import csv
+import datetime
+import io
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from myapp.models import Dbbi
+from myapp.services import projection
+from myapp.services.blind_index import normalize_date
+from myapp.services.durations import ABSENT, format_clock, format_cumulative
+from myapp.services.kpi import EXPECTED_SECONDS_PER_DAY, compute_kpis
+from myapp.services.myapp import OUTPUT_COLUMNS
+
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+DBBI_FIELDS = ('nom', 'date', 'entree_seconds', 'sortie_seconds', 'travail_seconds', 'travail_cumulee_seconds', 'absent')
+KPI_COLUMNS = ['Nom', 'Jours travaillés', 'Absences', 'Heures réalisées', 'Heures attendues', 'Heures restantes']
+
+_STREAM_BLOCK = 64 * 1024
+
+
+def dbbi_rows(period=None, chunk_size=None):
+    """Header then one row per Dbbi record (same values as the API), by day"""
+    queryset = Dbbi.objects.order_by('epoch_day', 'id')
+    if period is not None:
+        queryset = period.filter_dbbi(queryset)
+
+    yield OUTPUT_COLUMNS
+    rows = projection.rows(DBBI_FIELDS, queryset=queryset, chunk_size=chunk_size or settings.DBBI_STREAM_CHUNK_SIZE)
+    for nom, date, entree, sortie, travail, travail_cumulee, absent in rows:
+        missing = ABSENT if absent else None
+        yield [
+            nom,
+            datetime.date.fromisoformat(normalize_date(date)),
+            format_clock(entree) or missing,
+            format_clock(sortie) or missing,
+            format_clock(travail) or missing,
+            format_cumulative(travail_cumulee),
+        ]
+
+
+def kpi_rows(period=None):
+    """Header then one row per employee (from the daily aggregates), most hours first"""
+    kpis = compute_kpis(period)
+    expected = kpis.present * EXPECTED_SECONDS_PER_DAY
+    remaining = np.maximum(0, expected - kpis.worked)
+
+    yield KPI_COLUMNS
+    for i in np.argsort(-kpis.worked, kind='stable'):
+        yield [
+            kpis.noms[i],
+            int(kpis.present[i]),
+            int(kpis.absent[i]),
+            format_clock(int(kpis.worked[i])),
+            format_clock(int(expected[i])),
+            format_clock(int(remaining[i])),
+        ]
+
+
+def stream_csv(rows, rows_per_block=1000):
+    """
+    Encoded CSV, a block of rows at a time. Starts with a BOM so Excel
+    reads the accents as UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % rows_per_block == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def write_xlsx(rows, title):
+    """
+    Workbook of one sheet in openpyxl write-only mode: rows are written to
+    disk as they come instead of being kept as cells. The zip container is
+    only complete once every row is written, so the result is a temporary
+    file (rewound), to be streamed with stream_file().
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title)
+    for row in rows:
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    try:
+        workbook.save(output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def stream_file(file_obj):
+    """Yield a file in blocks and close it at the end"""
+    try:
+        for block in iter(lambda: file_obj.read(_STREAM_BLOCK), b''):
+            yield block
+    finally:
+        file_obj.close()
+
+
+def filename(prefix, period, file_format):
+    """'prefix[_nom][_start][_end].ext' for the Content-Disposition header"""
+    parts = [prefix]
+    if period is not None:
+        if period.nom:
+            parts.append(''.join(c if c.isalnum() else '-' for c in period.nom))
+        parts.extend(str(day) for day in (period.start, period.end) if day)
+    return f"{'_'.join(parts)}.{file_format}"
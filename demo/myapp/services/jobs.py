@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from myapp.models import IngestionJob
+from myapp.services.persistence import record_ingested
+from myapp.services.streaming import ingest_stream
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _pool():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGESTION_MAX_WORKERS,
+                thread_name_prefix='ingestion',
+            )
+            _slots = threading.BoundedSemaphore(settings.INGESTION_MAX_QUEUED)
+    return _executor
+
+
+def _store_upload(file_obj):
+    os.makedirs(settings.INGESTION_UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(file_obj.name)[1].lower()
+    path = os.path.join(settings.INGESTION_UPLOAD_DIR, f"{uuid.uuid4().hex}{extension}")
+    with open(path, 'wb') as destination:
+        for chunk in file_obj.chunks():
+            destination.write(chunk)
+    return path
+
+
+def submit(file_obj, fingerprint=None):
+    """
+    Save the uploaded file and queue it on the local worker pool.
+    fingerprint (see persistence.file_fingerprint) is recorded when the job
+    completes so the same file is not processed again.
+    Raises QueueFull when INGESTION_MAX_QUEUED jobs are already waiting or
+    running in this process.
+    """
+    pool = _pool()
+    if not _slots.acquire(blocking=False):
+        raise QueueFull(f"Too many uploads in progress (max {settings.INGESTION_MAX_QUEUED}), retry later")
+
+    try:
+        path = _store_upload(file_obj)
+        job = IngestionJob.objects.create(file_name=file_obj.name, file_path=path, fingerprint=fingerprint)
+        pool.submit(_run, job.pk)
+    except Exception:
+        _slots.release()
+        raise
+    return job
+
+
+def _update(job_id, **fields):
+    IngestionJob.objects.filter(pk=job_id).update(**fields)
+
+
+def _run(job_id):
+    """Worker: stream the workbook in chunks, each chunk is committed so progress is visible"""
+    job = None
+    try:
+        # Inside the try: a failed lookup must still release the slot
+        job = IngestionJob.objects.get(pk=job_id)
+        _update(job_id, status=IngestionJob.RUNNING, started_at=timezone.now())
+
+        def progress(rows_parsed, rows_saved, report):
+            _update(
+                job_id, rows_parsed=rows_parsed, rows_saved=rows_saved,
+                saved_records=report.saved, **report.as_dict(),
+            )
+
+        # A failed job keeps the chunks already saved, re-uploading the
+        # file skips them by content hash.
+        with open(job.file_path, 'rb') as file_obj:
+            rows_parsed, report = ingest_stream(file_obj, progress=progress)
+
+        if job.fingerprint:
+            record_ingested(job.fingerprint, job.file_name, os.path.getsize(job.file_path), rows_parsed, report)
+
+        _update(job_id, status=IngestionJob.DONE, finished_at=timezone.now())
+    except Exception as e:
+        logger.exception("Ingestion job %s failed", job_id)
+        _update(job_id, status=IngestionJob.FAILED, error_message=str(e)[:500], finished_at=timezone.now())
+    finally:
+        _slots.release()
+        if job is not None:
+            try:
+                os.remove(job.file_path)
+            except OSError:
+                pass
+        connection.close()
+
+
+def job_status(job):
+    return {
+        'job_id': job.pk,
+        'file_name': job.file_name,
+        'status': job.status,
+        'rows_parsed': job.rows_parsed,
+        'rows_saved': job.rows_saved,
+        'saved_records': job.saved_records,
+        'inserted': job.inserted,
+        'updated': job.updated,
+        'skipped': job.skipped,
+        'error': job.error_message,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,233 @@
+"""
+Re-encryption of the encrypted columns with the first FIELD_ENCRYPTION_KEY
+(key rotation). Stored tokens are rotated as they are (MultiFernet.rotate:
+decrypted with whichever configured key matches, encrypted again with the
+first one), values never go through the model fields.
+
+Rows are rewritten by id range over the parallel_scan process pool, one
+transaction per range. A checkpoint file records the finished ranges so an
+interrupted rotation resumes where it stopped.
+
+The blind index columns (HMACs under BLIND_INDEX_KEY) are not touched by a
+rotation, reindex() recomputes them when BLIND_INDEX_KEY itself changes.
+"""
+import hashlib
+import json
+import os
+import time
+from functools import partial
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from encrypted_model_fields.fields import EncryptedMixin, get_crypter
+
+from myapp.models import DailyAggregate, Dbbi, RunningTotal
+from myapp.services import aggregates, parallel_scan
+from myapp.services.blind_index import blind_index, content_hash, employee_index
+from myapp.services.durations import HASHED_FIELDS, hashed_values
+
+# Every model with encrypted columns (DailyAggregate.nom uses the same key)
+MODELS = (Dbbi, DailyAggregate)
+
+
+def encrypted_fields(model):
+    return [f for f in model._meta.concrete_fields if isinstance(f, EncryptedMixin)]
+
+
+def key_id():
+    """Fingerprint of the key tokens are encrypted with, to tell rotations apart"""
+    return hashlib.sha256(settings.FIELD_ENCRYPTION_KEY[0].encode()).hexdigest()[:16]
+
+
+def _tokens(model, bounds, lock=False):
+    """(pk, *raw tokens) of the rows of one id range"""
+    low, high = bounds
+    raw = {f'_raw_{f.name}': Cast(f.name, output_field=TextField()) for f in encrypted_fields(model)}
+    queryset = model.objects.select_for_update() if lock else model.objects
+    return queryset.filter(pk__gte=low, pk__lt=high).annotate(**raw).values_list('pk', *raw)
+
+
+def _update_sql(model):
+    # Raw UPDATE: the model fields would encrypt the tokens a second time,
+    # and bulk_update's CASE expressions would be encrypted as text
+    qn = connection.ops.quote_name
+    assignments = ', '.join(f'{qn(f.column)} = %s' for f in encrypted_fields(model))
+    return f'UPDATE {qn(model._meta.db_table)} SET {assignments} WHERE {qn(model._meta.pk.column)} = %s'
+
+
+def rotate_range(label, bounds):
+    """
+    Worker: re-encrypt the encrypted columns of one id range with the first key.
+    Returns (rows, invalid): rows rewritten, and tokens no configured key
+    decrypts (left as they are).
+    """
+    model = apps.get_model(label)
+    crypter = get_crypter()
+    params = []
+    invalid = 0
+    with transaction.atomic():
+        for pk, *tokens in _tokens(model, bounds, lock=True):
+            rotated = []
+            for token in tokens:
+                if token:
+                    try:
+                        token = crypter.rotate(token.encode()).decode()
+                    except InvalidToken:
+                        invalid += 1
+                rotated.append(token)
+            params.append((*rotated, pk))
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany(_update_sql(model), params)
+    return len(params), invalid
+
+
+def check_range(label, bounds):
+    """Worker: (rows, tokens the first key alone cannot decrypt) of one id range"""
+    model = apps.get_model(label)
+    primary = Fernet(settings.FIELD_ENCRYPTION_KEY[0])
+    rows = 0
+    stale = 0
+    for _, *tokens in _tokens(model, bounds):
+        rows += 1
+        for token in tokens:
+            if token:
+                try:
+                    primary.decrypt(token.encode())
+                except InvalidToken:
+                    stale += 1
+    return rows, stale
+
+
+class Checkpoint:
+    """
+    Progress of a rotation, saved as JSON after every range: the key it
+    rotates to, the id ranges of each model (fixed at the start) and the
+    ones finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    @property
+    def key(self):
+        return self.data.get('key')
+
+    def start(self, chunk_size=None):
+        """Fix the ranges of a new rotation to the first key"""
+        self.data = {'key': key_id(), 'started_at': time.time(), 'models': {}}
+        for model in MODELS:
+            self.data['models'][model._meta.label] = {
+                'ranges': parallel_scan.pk_ranges(chunk_size, model),
+                'done': [],
+                'rows': 0,
+                'invalid': 0,
+                'seconds': 0.0,
+            }
+        self.save()
+
+    def model(self, label):
+        return self.data['models'][label]
+
+    def pending(self, label):
+        state = self.model(label)
+        done = set(state['done'])
+        return [tuple(bounds) for bounds in state['ranges'] if bounds[0] not in done]
+
+    def finish(self, label, bounds, rows, invalid, seconds):
+        state = self.model(label)
+        state['done'].append(bounds[0])
+        state['rows'] += rows
+        state['invalid'] += invalid
+        state['seconds'] += seconds
+        self.save()
+
+    @property
+    def complete(self):
+        return bool(self.data) and not any(self.pending(label) for label in self.data['models'])
+
+    def save(self):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def rotate(checkpoint, workers=None, progress=None):
+    """
+    Rotate the pending ranges of the checkpoint, model by model. Ranges are
+    recorded as they come back (in order), so at most the ranges in flight
+    are redone after an interruption; rotating a range twice is harmless.
+    progress(label, rows, ranges_done, ranges_total, seconds) is called after every range.
+    Returns the number of worker processes used.
+    """
+    if connection.vendor == 'sqlite':
+        # A single writer at a time, parallel ranges would fail as locked
+        workers = 1
+    for label in checkpoint.data['models']:
+        pending = checkpoint.pending(label)
+        total = len(checkpoint.model(label)['ranges'])
+        start = time.perf_counter()
+        results = parallel_scan._scan(partial(rotate_range, label), workers, ranges=pending)
+        for bounds, (rows, invalid) in zip(pending, results):
+            elapsed = time.perf_counter() - start
+            start += elapsed
+            checkpoint.finish(label, bounds, rows, invalid, elapsed)
+            if progress:
+                state = checkpoint.model(label)
+                progress(label, state['rows'], len(state['done']), total, state['seconds'])
+    return workers or settings.PARALLEL_SCAN_WORKERS
+
+
+def check(workers=None, chunk_size=None):
+    """{model label: (rows, stale tokens)}, no stale token left means the old keys can go"""
+    result = {}
+    for model in MODELS:
+        label = model._meta.label
+        ranges = parallel_scan.pk_ranges(chunk_size, model)
+        rows = stale = 0
+        for range_rows, range_stale in parallel_scan._scan(partial(check_range, label), workers, ranges=ranges):
+            rows += range_rows
+            stale += range_stale
+        result[label] = (rows, stale)
+    return result
+
+
+def reindex_range(bounds):
+    """Worker: recompute the lookup_key, employee_key and content_hash of one Dbbi id range"""
+    low, high = bounds
+    rows = []
+    with transaction.atomic():
+        queryset = Dbbi.objects.select_for_update().filter(pk__gte=low, pk__lt=high)
+        for row in queryset.only('nom', 'date', *HASHED_FIELDS):
+            row.lookup_key = blind_index(row.nom, row.date)
+            row.employee_key = employee_index(row.nom)
+            row.content_hash = content_hash(*hashed_values(row))
+            rows.append(row)
+        # Plain columns only, the encrypted ones are not written back
+        Dbbi.objects.bulk_update(rows, ['lookup_key', 'employee_key', 'content_hash'])
+    return len(rows)
+
+
+def reindex(workers=None, chunk_size=None):
+    """
+    Recompute the blind index columns of every Dbbi row with the current
+    BLIND_INDEX_KEY, then the tables keyed by employee_key: daily aggregates
+    are rebuilt, running totals dropped (rebuilt from the aggregates on the
+    next ingestion). Returns the number of Dbbi rows rewritten.
+    """
+    if connection.vendor == 'sqlite':
+        workers = 1
+    rows = sum(parallel_scan._scan(reindex_range, workers, ranges=parallel_scan.pk_ranges(chunk_size)))
+    with transaction.atomic():
+        RunningTotal.objects.all().delete()
+        aggregates.rebuild()
+    return rows
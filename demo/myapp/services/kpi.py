@@ -0,0 +1,174 @@
+import numpy as np
+from django.db.models import Min, Subquery, Sum
+
+from myapp.models import DailyAggregate
+
+WEEKDAYS = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
+EXPECTED_SECONDS_PER_DAY = 8 * 3600
+
+
+def format_hm(seconds):
+    """Format seconds to HH:MM string (without seconds)"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}"
+
+
+def format_hms(seconds):
+    """Format seconds to HH:MM:SS string"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+
+class KpiResult:
+    """
+    Every dashboard KPI derived from one scan of the daily aggregates.
+    Per-employee values are int64 arrays aligned with `noms`, weekday values
+    are indexed 0 (Lun) to 6 (Dim).
+    """
+
+    def __init__(self, noms, worked, present, absent, weekday_worked, weekday_present):
+        self.noms = noms
+        self.worked = worked
+        self.present = present
+        self.absent = absent
+        self.weekday_worked = weekday_worked
+        self.weekday_present = weekday_present
+
+    @property
+    def employee_count(self):
+        return len(self.noms)
+
+    @property
+    def total_worked(self):
+        return int(self.worked.sum())
+
+    @property
+    def days_present(self):
+        return int(self.present.sum())
+
+    @property
+    def total_records(self):
+        return int(self.present.sum() + self.absent.sum())
+
+    @property
+    def expected_seconds(self):
+        return self.days_present * EXPECTED_SECONDS_PER_DAY
+
+    @property
+    def remaining_seconds(self):
+        return max(0, self.expected_seconds - self.total_worked)
+
+    def _pick(self, reducer):
+        candidates = np.flatnonzero(self.worked > 0)
+        if not len(candidates):
+            return None
+        best = candidates[reducer(self.worked[candidates])]
+        return {'nom': self.noms[best], 'worked_seconds': int(self.worked[best])}
+
+    def best(self):
+        """Employee with the most worked seconds, None without any worked time"""
+        return self._pick(np.argmax)
+
+    def worst(self):
+        """Employee with the least (non-zero) worked seconds"""
+        return self._pick(np.argmin)
+
+    def weekly(self, all_days=True):
+        """[(day_name, worked_seconds)] in day order, optionally only days with data"""
+        return [
+            (day, int(self.weekday_worked[i]))
+            for i, day in enumerate(WEEKDAYS)
+            if all_days or self.weekday_present[i]
+        ]
+
+    def employees(self):
+        """[(nom, worked_seconds)] sorted by worked seconds, most first"""
+        order = np.argsort(-self.worked, kind='stable')
+        return [(self.noms[i], int(self.worked[i])) for i in order]
+
+    def remaining_by_employee(self):
+        """Realized vs expected (8h per worked day) per employee who worked, most deficit first"""
+        expected = self.present * EXPECTED_SECONDS_PER_DAY
+        remaining = np.maximum(0, expected - self.worked)
+        order = [i for i in np.argsort(-remaining, kind='stable') if self.present[i] > 0]
+        return [
+            {
+                'nom': self.noms[i],
+                'jours_travailles': int(self.present[i]),
+                'worked_seconds': int(self.worked[i]),
+                'expected_seconds': int(expected[i]),
+                'remaining_seconds': int(remaining[i]),
+            }
+            for i in order
+        ]
+
+
+def _filtered(period=None):
+    aggregates = DailyAggregate.objects.all()
+    if period is not None:
+        aggregates = period.filter_aggregates(aggregates)
+    return aggregates
+
+
+def grouped_rows(period=None):
+    """(employee_key, iso_weekday, worked, present, absent) per employee and weekday"""
+    return (
+        _filtered(period).order_by()
+        .values_list('employee_key', 'iso_weekday')
+        .annotate(
+            worked=Sum('worked_seconds'),
+            present=Sum('days_present'),
+            absent=Sum('absences'),
+        )
+    )
+
+
+def employee_names(period=None):
+    """(employee_key, nom) pairs, one decrypted nom per employee (its first aggregate)"""
+    first_ids = _filtered(period).order_by().values('employee_key').annotate(first_id=Min('id')).values('first_id')
+    return DailyAggregate.objects.filter(id__in=Subquery(first_ids)).values_list('employee_key', 'nom')
+
+
+def build_kpis(rows, names):
+    """KpiResult from grouped_rows() and employee_names() results (CPU only, no queries)"""
+    index = {}
+    employee_idx = []
+    weekday_idx = []
+    values = []
+    for key, weekday, worked, present, absent in rows:
+        if key not in index:
+            index[key] = len(index)
+        employee_idx.append(index[key])
+        weekday_idx.append(weekday - 1)
+        values.append((worked, present, absent))
+
+    values = np.array(values, dtype=np.int64).reshape(-1, 3)
+    employee_idx = np.array(employee_idx, dtype=np.int64)
+    weekday_idx = np.array(weekday_idx, dtype=np.int64)
+
+    n = len(index)
+    worked = np.zeros(n, dtype=np.int64)
+    present = np.zeros(n, dtype=np.int64)
+    absent = np.zeros(n, dtype=np.int64)
+    weekday_worked = np.zeros(7, dtype=np.int64)
+    weekday_present = np.zeros(7, dtype=np.int64)
+    np.add.at(worked, employee_idx, values[:, 0])
+    np.add.at(present, employee_idx, values[:, 1])
+    np.add.at(absent, employee_idx, values[:, 2])
+    np.add.at(weekday_worked, weekday_idx, values[:, 0])
+    np.add.at(weekday_present, weekday_idx, 1)
+
+    noms = [None] * n
+    for key, i in index.items():
+        noms[i] = names[key]
+
+    return KpiResult(noms, worked, present, absent, weekday_worked, weekday_present)
+
+
+def compute_kpis(period=None):
+    """
+    Scan the daily aggregates once, grouped in SQL per (employee, weekday),
+    into compact integer arrays. Only one nom per employee is decrypted.
+    period: optional Period (start / end / nom) applied in SQL first.
+    """
+    return build_kpis(list(grouped_rows(period)), dict(employee_names(period)))
@@ -0,0 +1,193 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from myapp.models import DatasetVersion
+from myapp.services import metrics
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'not_modified': 0}
+# Entries this process stored, per dataset version still current when last seen
+_stored_for_version = {}
+
+
+def _cache():
+    return caches[settings.KPI_CACHE_ALIAS]
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+    if name in ('hits', 'misses', 'not_modified'):
+        metrics.kpi_cache_lookups.inc(amount, result=name)
+
+
+def _state():
+    """
+    (version, modified) of the dataset. Kept in the database rather than the
+    cache so a bump reaches every worker process, even with a per-process
+    cache; the first version is seeded from the clock so it never matches
+    entries cached before a reset.
+    """
+    state = DatasetVersion.objects.filter(pk=1).values_list('version', 'modified').first()
+    if state is None:
+        now = time.time()
+        row, _ = DatasetVersion.objects.get_or_create(pk=1, defaults={'version': int(now * 1000), 'modified': now})
+        state = (row.version, row.modified)
+    _superseded(state[0])
+    return state
+
+
+def _superseded(version):
+    """Count the entries stored under older versions as invalidated (unreachable), and forget them"""
+    with _lock:
+        for old in [v for v in _stored_for_version if v < version]:
+            _stats['invalidated'] += _stored_for_version.pop(old)
+
+
+def dataset_version():
+    return _state()[0]
+
+
+def last_modified():
+    return _state()[1]
+
+
+def lock_writes():
+    """
+    Lock the DatasetVersion row until the current transaction ends. Writers
+    of Dbbi rows, their aggregates and running totals take it first, so two
+    uploads sharing employees or (nom, date) rows run one after the other
+    instead of both inserting the same unique keys.
+    """
+    _state()  # the row must exist to be locked
+    list(DatasetVersion.objects.select_for_update().filter(pk=1).values_list('pk'))
+
+
+def bump_version():
+    """Invalidate every cached KPI, called after any Dbbi write"""
+    DatasetVersion.objects.filter(pk=1).update(version=F('version') + 1, modified=time.time())
+
+
+def stats():
+    """
+    Counters of this process. 'invalidated' counts the entries it stored that
+    a newer dataset version made unreachable (left to expire in the backend);
+    entries the backend drops itself (timeout, MAX_ENTRIES) show up as misses.
+    """
+    with _lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 3) if lookups else 0.0
+    data['version'] = dataset_version()
+    return data
+
+
+def _cache_key(request, version):
+    params = sorted(getattr(request, 'query_params', request.GET).lists())
+    digest = hashlib.sha256(f"{request.path}?{params}".encode()).hexdigest()[:32]
+    return f"kpi:{version}:{digest}"
+
+
+def _not_modified(request, etag, modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(modified) <= since
+
+
+def _validators(request, version, modified):
+    key = _cache_key(request, version)
+    etag = f'"{key.split(":", 2)[2][:16]}-{version}"'
+    return key, etag, {'ETag': etag, 'Last-Modified': http_date(modified)}
+
+
+def _stored(version):
+    with _lock:
+        _stored_for_version[version] = _stored_for_version.get(version, 0) + 1
+
+
+def cached_kpi(view):
+    """
+    Cache a KPI view's response data per endpoint, query parameters and
+    dataset version, and answer conditional requests with 304.
+    Goes below @api_view so it receives the DRF request.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with metrics.kpi_request_seconds.time(endpoint=view.__name__):
+            return cached(request, *args, **kwargs)
+
+    def cached(request, *args, **kwargs):
+        version, modified = _state()
+        key, etag, headers = _validators(request, version, modified)
+
+        if _not_modified(request, etag, modified):
+            _count('not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = _cache().get(key)
+        if data is not None:
+            _count('hits')
+            return Response(data, headers=headers)
+
+        _count('misses')
+        response = view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+        _cache().set(key, response.data, timeout=settings.KPI_CACHE_TIMEOUT)
+        _stored(version)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    return wrapper
+
+
+def acached_kpi(view):
+    """
+    cached_kpi for async Django views returning JSON: the rendered body is
+    cached, the cache is read and written with the async cache API.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        with metrics.kpi_request_seconds.time(endpoint=view.__name__):
+            return await cached(request, *args, **kwargs)
+
+    async def cached(request, *args, **kwargs):
+        version, modified = await sync_to_async(_state)()
+        key, etag, headers = _validators(request, version, modified)
+
+        if _not_modified(request, etag, modified):
+            _count('not_modified')
+            return HttpResponseNotModified(headers=headers)
+
+        body = await _cache().aget(key)
+        if body is not None:
+            _count('hits')
+            return HttpResponse(body, content_type='application/json', headers=headers)
+
+        _count('misses')
+        response = await view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+        await _cache().aset(key, response.content, timeout=settings.KPI_CACHE_TIMEOUT)
+        _stored(version)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    return wrapper
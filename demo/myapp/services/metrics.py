@@ -0,0 +1,162 @@
+"""
+Process-local metrics in the Prometheus text exposition format, served by
+/api/metrics/. Each thread updates its own cells, so the hot paths never
+take a lock; scrapes sum the cells of every thread.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _shard(self):
+        """This thread's {label values: cell}, registered once per thread"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _cells(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        cells = {}
+        for shard in shards:
+            for key, cell in list(shard.items()):
+                cells.setdefault(key, []).append(cell)
+        return cells
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0]
+        cell[0] += amount
+
+    def value(self, **labels):
+        return sum(cell[0] for cell in self._cells().get(self._key(labels), []))
+
+    def _samples(self):
+        for key, cells in sorted(self._cells().items()):
+            total = sum(cell[0] for cell in cells)
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(total)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        cell = shard.get(key)
+        if cell is None:
+            # one count per bucket plus +Inf, then sum and count
+            cell = shard[key] = [0] * (len(self.buckets) + 3)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        bounds = self.buckets + (float('inf'),)
+        for key, cells in sorted(self._cells().items()):
+            merged = [sum(values) for values in zip(*cells)]
+            cumulative = 0
+            for bound, count in zip(bounds, merged):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(float(merged[-2]))}"
+            yield f"{self.name}_count{labels} {merged[-1]}"
+
+
+def render():
+    """Every registered metric in the text exposition format (version 0.0.4)"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+rows_parsed = Counter(
+    'datapulse_rows_parsed_total', "Attendance rows parsed from uploaded workbooks", ['path'],
+)
+rows_saved = Counter(
+    'datapulse_rows_saved_total', "Parsed rows by persistence outcome", ['result'],
+)
+ingestion_stage_seconds = Histogram(
+    'datapulse_ingestion_stage_seconds', "Time spent per ingestion stage (read, compute, persist)", ['stage'],
+)
+kpi_request_seconds = Histogram(
+    'datapulse_kpi_request_seconds', "KPI endpoint latency, cache hits included", ['endpoint'],
+)
+kpi_cache_lookups = Counter(
+    'datapulse_kpi_cache_lookups_total', "KPI cache lookups by result", ['result'],
+)
+function_result_write_failures = Counter(
+    'datapulse_function_result_write_failures_total', "FunctionResult audit rows that could not be written", ['mode'],
+)
+function_result_dropped = Counter(
+    'datapulse_function_result_dropped_total', "FunctionResult audit rows dropped because the queue was full",
+)
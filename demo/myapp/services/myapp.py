@@ -1,17 +1,31 @@
+import numpy as np
 import pandas as pd
 import datetime
-import json
+import logging
+import warnings
 from myapp.services.result_service import post  # Import the decorator
+from myapp.services.durations import parse_seconds
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['Entrée.', 'Sortie.', 'Nom.', 'Date.']
+OUTPUT_COLUMNS = ['Nom', 'Date', 'Entrée', 'Sortie', 'Travail', 'Travail Cumulée']
+SECONDS_PER_DAY = 86400
+
 
 def parse_hms_to_duration(hms_string):
     """Convert HH:MM:SS string to datetime.timedelta object"""
     if hms_string == 'Abs':
         return datetime.timedelta(0)
-    
+
     hours, minutes, seconds = map(int, hms_string.split(':'))
     return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
 
-def compute_cumulative(records):
+def _compute_cumulative_rowwise(records):
+    """
+    Original per-record cumulative loop, kept as the reference for
+    compute_cumulative in the parse benchmark
+    """
     cumul = {}
     result = []
     for rec in records:
@@ -30,26 +44,177 @@ def compute_cumulative(records):
         result.append(rec)
     return result
 
-@post  # Add this decorator to save results to database
-def parse_excel(file_obj) -> pd.DataFrame:
+
+# Lookup tables for bulk formatting
+_TWO_DIGITS = np.array([f"{i:02}" for i in range(100)], dtype=object)
+_HOURS = np.array([str(i) for i in range(24)], dtype=object)
+
+
+def _hms(total_seconds):
+    h = total_seconds // 3600
+    m = (total_seconds % 3600) // 60
+    s = total_seconds % 60
+    return f"{h:02}:{m:02}:{s:02}"
+
+
+def is_worked(travail):
+    """True for a Travail value that is an actual duration (not 'Abs' or empty)"""
+    return isinstance(travail, str) and travail.strip() not in ('Abs', '')
+
+
+def parse_duration_seconds(travail):
+    """Seconds in an 'HH:MM:SS' or 'HH:MM' duration, 0 for 'Abs', empty or invalid values"""
+    return parse_seconds(travail) or 0
+
+
+def format_hms(seconds):
     """
-    Parses the Excel file like your original code:
-    - Reads columns: 'Entrée.', 'Sortie.', 'Nom.', 'Date.'
-    - Computes Travail as delta(Sortie - Entrée)
-    - Marks 'Abs' where either is NaT
-    - Builds cumulative per person
-    - Reorders columns to match your schema
+    Format an integer seconds Series as HH:MM:SS strings. Each distinct value
+    is formatted once and broadcast back, there are at most a few thousand.
     """
-    # Support .xlsx and .xls by letting pandas guess engine
-    df = pd.read_excel(file_obj)
+    codes, uniques = pd.factorize(seconds)
+    labels = np.array([_hms(int(value)) for value in uniques] + [None], dtype=object)
+    return pd.Series(labels[codes], index=seconds.index)
+
+
+def travail_seconds(travail):
+    """Convert a Series of HH:MM:SS / 'Abs' strings to integer seconds, parsing each distinct value once"""
+    codes, uniques = pd.factorize(travail)
+    values = np.array([parse_duration_seconds(value) for value in uniques] + [0], dtype='int64')
+    return pd.Series(values[codes], index=travail.index)
+
+
+def format_timedelta(seconds):
+    """
+    Format an integer seconds Series exactly like str(datetime.timedelta),
+    e.g. '9:00:00' or '2 days, 3:15:00', with lookup tables instead of a
+    per-row format call
+    """
+    values = seconds.to_numpy(dtype='int64')
+    days = values // 86400
+    rest = values % 86400
+    clock = (
+        _HOURS[rest // 3600] + ':'
+        + _TWO_DIGITS[(rest % 3600) // 60] + ':'
+        + _TWO_DIGITS[rest % 60]
+    )
+    multi_day = days != 0
+    if multi_day.any():
+        d = days[multi_day]
+        plural = np.where(np.abs(d) != 1, 's', '').astype(object)
+        clock[multi_day] = d.astype(str).astype(object) + ' day' + plural + ', ' + clock[multi_day]
+    return pd.Series(clock, index=seconds.index)
+
+
+def _seconds_of_day(column):
+    """Seconds since midnight of a datetime64 Series (truncated like strftime)"""
+    return (column - column.dt.normalize()) // pd.Timedelta(seconds=1)
 
-    required = ['Entrée.', 'Sortie.', 'Nom.', 'Date.']
-    if not all(c in df.columns for c in required):
-        raise ValueError("Colonnes requises manquantes: 'Entrée.', 'Sortie.', 'Nom.', 'Date.'")
 
+def sort_attendance(df):
+    """Sort by Nom, then Date (missing dates first) to make cumulative deterministic"""
+    nom_key = df['Nom'].map(str)
+    date_key = pd.to_datetime(df['Date'], errors='coerce').fillna(pd.Timestamp.min)
+    order = pd.DataFrame({'nom': nom_key.to_numpy(), 'date': date_key.to_numpy()})
+    order = order.sort_values(['nom', 'date'], kind='stable').index
+    return df.iloc[order].reset_index(drop=True)
+
+
+def compute_cumulative(df, previous_totals=None):
+    """
+    Adds 'Travail Cumulée' per employee:
+    - Sorts once by Nom, then Date
+    - Runs a grouped cumulative sum over integer seconds
+    - Formats the running totals in bulk
+    previous_totals maps Nom to the seconds already accumulated, so a batch of
+    new days continues an employee's existing total instead of restarting.
+    """
+    df = sort_attendance(df)
+    seconds = travail_seconds(df['Travail'])
+    cumul = seconds.groupby(df['Nom'], dropna=False, sort=False).cumsum()
+
+    if previous_totals:
+        cumul = cumul + df['Nom'].map(previous_totals).fillna(0).astype('int64')
+
+    df['Travail Cumulée'] = format_timedelta(cumul).to_numpy(dtype=object)
+    return df
+
+
+def running_totals(df, previous_totals=None):
+    """Cumulative seconds per Nom after this batch, to pass to the next compute_cumulative call"""
+    totals = dict(previous_totals or {})
+    sums = travail_seconds(df['Travail']).groupby(df['Nom'], sort=False).sum()
+    for nom, seconds in sums.items():
+        totals[nom] = totals.get(nom, 0) + int(seconds)
+    return totals
+
+
+def _convert_distinct(column, convert):
+    """
+    Run a whole-column converter on the distinct values only and broadcast
+    the result back: exports repeat the same dates and badge times a lot.
+    """
+    codes, uniques = pd.factorize(column)
+    converted = convert(pd.Series(uniques, dtype=object)).to_numpy()
+    converted = np.append(converted, np.array(['NaT'], dtype=converted.dtype))
+    return pd.Series(converted[codes], index=column.index)
+
+
+def _parse_times(column):
+    """
+    Badge times are plain 'HH:MM:SS' strings, which pandas anchors on today's
+    date when parsed one cell at a time, so the fast path does the same.
+    Cells in any other format are re-parsed one by one, which gives the same
+    result as calling pd.to_datetime on each cell.
+    """
+    today = pd.Timestamp.today().normalize()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        parsed = pd.to_datetime(column, format='%H:%M:%S', errors='coerce')
+        parsed = parsed + (today - pd.Timestamp('1900-01-01'))
+        missed = parsed.isna() & column.notna()
+        if missed.any():
+            parsed[missed] = pd.to_datetime(column[missed], errors='coerce', format='mixed')
+    return parsed
+
+
+def _parse_dates(column):
+    return pd.to_datetime(column, format='%d/%m/%Y', errors='coerce')
+
+
+def extract_attendance(df):
+    """
+    Columnar version of the per-row extraction:
+    - Converts 'Entrée.', 'Sortie.' and 'Date.' as whole columns
+    - Computes Travail as one (Sortie - Entrée) column subtraction, an exit
+      before the entry is an overnight shift ending the next day
+    - Marks 'Abs' with a mask where either time is missing
+    """
+    entree = _convert_distinct(df['Entrée.'], _parse_times)
+    sortie = _convert_distinct(df['Sortie.'], _parse_times)
+    date = _convert_distinct(df['Date.'], _parse_dates)
+
+    present = entree.notna() & sortie.notna()
+    seconds = (sortie - entree).dt.total_seconds().where(present, 0).astype('int64') % SECONDS_PER_DAY
+    entree_s = _seconds_of_day(entree).where(present, 0).astype('int64')
+    sortie_s = _seconds_of_day(sortie).where(present, 0).astype('int64')
+
+    return pd.DataFrame({
+        'Nom': df['Nom.'].to_numpy(dtype=object),
+        'Date': pd.Series(date.dt.date, dtype=object).where(date.notna(), None).to_numpy(),
+        'Entrée': format_hms(entree_s).where(present, 'Abs').to_numpy(dtype=object),
+        'Sortie': format_hms(sortie_s).where(present, 'Abs').to_numpy(dtype=object),
+        'Travail': format_hms(seconds).where(present, 'Abs').to_numpy(dtype=object),
+    })
+
+
+def _extract_attendance_rowwise(df):
+    """
+    Original row-by-row extraction, kept as the reference for
+    extract_attendance in the parse benchmark (sorted like sort_attendance)
+    """
     extracted = []
 
-    # Normalize and compute row-wise
     for _, row in df.iterrows():
         entree = pd.to_datetime(row['Entrée.'], errors='coerce')
         sortie = pd.to_datetime(row['Sortie.'], errors='coerce')
@@ -58,7 +223,7 @@ def parse_excel(file_obj) -> pd.DataFrame:
 
         if pd.notna(entree) and pd.notna(sortie):
             delta = sortie - entree
-            total_seconds = int(delta.total_seconds())
+            total_seconds = int(delta.total_seconds()) % SECONDS_PER_DAY  # overnight shift
             h = total_seconds // 3600
             m = (total_seconds % 3600) // 60
             s = total_seconds % 60
@@ -79,14 +244,75 @@ def parse_excel(file_obj) -> pd.DataFrame:
                 'Travail': 'Abs',
             })
 
-    # Sort by Nom, then Date to make cumulative deterministic
-    extracted.sort(key=lambda r: (str(r['Nom']), r['Date'] or pd.Timestamp.min))
+    extracted.sort(key=lambda r: (str(r['Nom']), pd.Timestamp(r['Date']) if r['Date'] else pd.Timestamp.min))
+    return extracted
+
+
+def read_excel(file_obj):
+    """Read the first sheet, picking the engine from the file extension"""
+    try:
+        # Get file name to determine extension
+        file_name = getattr(file_obj, 'name', '').lower()
+        
+        # Specify engine based on file extension
+        if file_name.endswith('.xlsx'):
+            engine = 'openpyxl'
+        elif file_name.endswith('.xls'):
+            engine = 'xlrd'
+        else:
+            # For unknown extensions, try both engines
+            engine = None
+
+        # Read the Excel file
+        if engine:
+            df = pd.read_excel(file_obj, engine=engine)
+        else:
+            # Try both engines for unknown file types
+            try:
+                file_obj.seek(0)
+                df = pd.read_excel(file_obj, engine='openpyxl')
+            except Exception:
+                file_obj.seek(0)
+                df = pd.read_excel(file_obj, engine='xlrd')
+            
+    except Exception as e:
+        logger.warning("Error reading Excel file: %s", e)
+        raise ValueError(f"Cannot read Excel file. Please ensure it's a valid Excel file (.xls or .xlsx). Error: {str(e)}")
+    return df
 
-    # Compute cumulative
+
+def validate_columns(columns):
+    columns = list(columns)
+    if not all(c in columns for c in REQUIRED_COLUMNS):
+        raise ValueError(f"Colonnes requises manquantes. Requises: {REQUIRED_COLUMNS}. Disponibles: {columns}")
+
+
+def build_attendance(df):
+    """
+    Validates the raw sheet and builds the output schema:
+    'Nom', 'Date', 'Entrée', 'Sortie', 'Travail', 'Travail Cumulée'
+    """
+    validate_columns(df.columns)
+
+    extracted = extract_attendance(df)
+
+    # Sort and compute cumulative
     with_cumul = compute_cumulative(extracted)
 
     # Reorder cols
-    out_df = pd.DataFrame(with_cumul)[
-        ['Nom', 'Date', 'Entrée', 'Sortie', 'Travail', 'Travail Cumulée']
-    ]
-    return out_df
\ No newline at end of file
+    return with_cumul[OUTPUT_COLUMNS]
+
+
+@post  # Add this decorator to save results to database
+def parse_excel(file_obj) -> pd.DataFrame:
+    """
+    Parses the Excel file like your original code:
+    - Reads columns: 'Entrée.', 'Sortie.', 'Nom.', 'Date.'
+    - Computes Travail as delta(Sortie - Entrée)
+    - Marks 'Abs' where either is NaT
+    - Builds cumulative per person
+    - Reorders columns to match your schema
+    """
+    # Support .xlsx and .xls by letting pandas guess engine
+    df = pd.read_excel(file_obj)
+    return build_attendance(df)
@@ -0,0 +1,114 @@
+"""
+Full scans of the Dbbi table split by primary-key ranges over a process pool.
+Decrypting and parsing every row is CPU-bound, one process per core gets
+around the GIL. Each worker scans its ranges and returns partial sums, the
+parent merges them in range order so the result is the same as a serial scan.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Max, Min
+
+from myapp.models import Dbbi
+from myapp.services import aggregates, projection
+from myapp.services.blind_index import epoch_day, normalize_nom
+from myapp.services.kpi import KpiResult
+from myapp.services.snapshot import FIELDS
+
+
+def pk_ranges(chunk_size=None, model=Dbbi):
+    """[(low, high)] half-open id ranges of chunk_size ids covering the table"""
+    chunk_size = chunk_size or settings.PARALLEL_SCAN_CHUNK_SIZE
+    bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    return [
+        (low, min(low + chunk_size, bounds['high'] + 1))
+        for low in range(bounds['low'], bounds['high'] + 1, chunk_size)
+    ]
+
+
+def _range_rows(bounds):
+    low, high = bounds
+    queryset = Dbbi.objects.filter(id__gte=low, id__lt=high).order_by('id')
+    return projection.rows(FIELDS, queryset=queryset, chunk_size=settings.DBBI_STREAM_CHUNK_SIZE)
+
+
+def _scan(func, workers=None, chunk_size=None, ranges=None):
+    """Yield func(range) for every pk range (default: all of Dbbi), in range order"""
+    workers = workers or settings.PARALLEL_SCAN_WORKERS
+    ranges = pk_ranges(chunk_size) if ranges is None else ranges
+    if workers <= 1 or len(ranges) <= 1:
+        for bounds in ranges:
+            yield func(bounds)
+        return
+
+    if connection.in_atomic_block:
+        raise RuntimeError("A parallel scan cannot run inside a transaction")
+    # Forked workers must not share the parent's database sockets, each
+    # one opens its own connection on first query.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=django.setup) as pool:
+        yield from pool.map(func, ranges)
+
+
+def _kpi_partial(bounds):
+    """Worker: per-employee [worked, present, absent] and per-weekday sums of one range"""
+    employees = {}
+    weekday_worked = [0] * 7
+    weekday_rows = [0] * 7
+    for nom, date, seconds, absent in _range_rows(bounds):
+        sums = employees.setdefault(normalize_nom(nom), [0, 0, 0])
+        weekday = (epoch_day(date) + 3) % 7
+        weekday_rows[weekday] += 1
+        if seconds is not None:
+            sums[0] += seconds
+            sums[1] += 1
+            weekday_worked[weekday] += seconds
+        elif absent:
+            sums[2] += 1
+    return employees, weekday_worked, weekday_rows
+
+
+def parallel_kpis(workers=None, chunk_size=None):
+    """
+    KpiResult over the whole Dbbi table, identical to
+    snapshot.build_snapshot().kpis() (employees in order of their first row).
+    """
+    employees = {}
+    weekday_worked = np.zeros(7, dtype=np.int64)
+    weekday_rows = np.zeros(7, dtype=np.int64)
+    for partial, partial_worked, partial_rows in _scan(_kpi_partial, workers, chunk_size):
+        for nom, values in partial.items():
+            sums = employees.setdefault(nom, [0, 0, 0])
+            sums[0] += values[0]
+            sums[1] += values[1]
+            sums[2] += values[2]
+        weekday_worked += partial_worked
+        weekday_rows += partial_rows
+
+    values = np.array(list(employees.values()), dtype=np.int64).reshape(-1, 3)
+    return KpiResult(list(employees), values[:, 0], values[:, 1], values[:, 2], weekday_worked, weekday_rows)
+
+
+def _daily_partial(bounds):
+    """Worker: aggregates._group_rows() of one range"""
+    return aggregates._group_rows(_range_rows(bounds))
+
+
+def parallel_daily_groups(workers=None, chunk_size=None):
+    """{(employee_key, day): {'nom', 'worked', 'present', 'absent'}} over the whole Dbbi table"""
+    groups = {}
+    for partial in _scan(_daily_partial, workers, chunk_size):
+        for key, values in partial.items():
+            group = groups.get(key)
+            if group is None:
+                groups[key] = values
+            else:
+                group['worked'] += values['worked']
+                group['present'] += values['present']
+                group['absent'] += values['absent']
+    return groups
@@ -0,0 +1,83 @@
+from functools import wraps
+
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from myapp.services.blind_index import employee_index, epoch_day
+
+
+class Period:
+    """
+    start / end (inclusive dates) and nom filters, applied in SQL on the
+    plaintext day keys and the employee blind index, before any decryption
+    """
+
+    def __init__(self, start=None, end=None, nom=None):
+        self.start = start
+        self.end = end
+        self.nom = nom or None
+
+    @classmethod
+    def from_params(cls, params):
+        """Build from ?start=YYYY-MM-DD&end=YYYY-MM-DD&nom=..., ValueError on bad input"""
+        start = cls._date(params, 'start')
+        end = cls._date(params, 'end')
+        if start and end and start > end:
+            raise ValueError("start must be before end")
+        return cls(start, end, params.get('nom', '').strip())
+
+    @staticmethod
+    def _date(params, name):
+        raw = params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+        return value
+
+    @property
+    def is_empty(self):
+        return self.start is None and self.end is None and self.nom is None
+
+    @property
+    def employee_key(self):
+        return employee_index(self.nom) if self.nom else None
+
+    def filter_dbbi(self, queryset):
+        if self.start:
+            queryset = queryset.filter(epoch_day__gte=epoch_day(self.start))
+        if self.end:
+            queryset = queryset.filter(epoch_day__lte=epoch_day(self.end))
+        if self.nom:
+            queryset = queryset.filter(employee_key=self.employee_key)
+        return queryset
+
+    def filter_aggregates(self, queryset):
+        if self.start:
+            queryset = queryset.filter(day__gte=self.start)
+        if self.end:
+            queryset = queryset.filter(day__lte=self.end)
+        if self.nom:
+            queryset = queryset.filter(employee_key=self.employee_key)
+        return queryset
+
+
+def with_period(view):
+    """
+    Parse the start / end / nom query parameters into a Period passed as the
+    `period` keyword, 400 on invalid values. Goes below @api_view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            period = Period.from_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return view(request, *args, period=period, **kwargs)
+
+    return wrapper
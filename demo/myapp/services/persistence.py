@@ -0,0 +1,189 @@
+import hashlib
+import logging
+from functools import partial
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from myapp.models import Dbbi, IngestedFile
+from myapp.services import aggregates, cumulative, kpi_cache, metrics
+from myapp.services.blind_index import blind_index, content_hash, employee_index, epoch_day
+from myapp.services.durations import hashed_values, typed_fields
+
+logger = logging.getLogger(__name__)
+
+
+class SaveReport:
+    """Row counts of one or more bulk_save calls"""
+
+    def __init__(self, inserted=0, updated=0, skipped=0):
+        self.inserted = inserted
+        self.updated = updated
+        self.skipped = skipped
+
+    @property
+    def saved(self):
+        return self.inserted + self.updated
+
+    def add(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+    def as_dict(self):
+        return {'inserted': self.inserted, 'updated': self.updated, 'skipped': self.skipped}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _record_hash(record):
+    return content_hash(*hashed_values(typed_fields(record)))
+
+
+def bulk_save(data, batch_size=None, outcomes=None):
+    """
+    Upsert parsed records keyed on the (nom, date) blind index, inside a
+    single transaction that also maintains the daily aggregates:
+    - new keys are written with bulk_create
+    - existing keys with a different content hash are updated in place
+    - existing keys with the same content hash are skipped, not decrypted
+    'Travail Cumulée' is continued from each employee's stored running total
+    (also set on the written records), not restarted for every file.
+    With ARCHIVE_ENABLED the written records are appended to the Parquet
+    archive once committed.
+    outcomes: optional dict, filled with {lookup_key: 'inserted' | 'updated'
+    | 'skipped'} for the first record of every key.
+    Returns a SaveReport.
+    """
+    batch_size = batch_size or settings.DBBI_BULK_BATCH_SIZE
+    report = SaveReport()
+
+    # Key every record once, the first record wins for duplicate (nom, date)
+    keyed = {}
+    for index, record in enumerate(data):
+        # Only the row index is logged, records hold decrypted attendance data
+        if pd.isna(record.get('Nom')) or pd.isna(record.get('Date')):
+            logger.warning("Skipped record %d: missing Nom or Date", index)
+            report.skipped += 1
+            continue
+        try:
+            key = blind_index(record['Nom'], record['Date'])
+        except Exception as e:
+            logger.warning("Skipped record %d: %s", index, type(e).__name__)
+            report.skipped += 1
+            continue
+        if key in keyed:
+            report.skipped += 1
+        else:
+            keyed[key] = record
+
+    keys = list(keyed)
+    written = {}
+    with transaction.atomic():
+        # Existing keys are only known once concurrent writers are done
+        kpi_cache.lock_writes()
+        for chunk in _chunks(keys, batch_size):
+            existing = dict(
+                Dbbi.objects.filter(lookup_key__in=chunk).values_list('lookup_key', 'content_hash')
+            )
+            hashes = {key: _record_hash(keyed[key]) for key in chunk}
+            new_keys = [key for key in chunk if key not in existing]
+            changed_keys = [key for key in chunk if key in existing and existing[key] != hashes[key]]
+            report.skipped += len(chunk) - len(new_keys) - len(changed_keys)
+            if outcomes is not None:
+                outcomes.update((key, 'skipped') for key in chunk)
+                outcomes.update((key, 'inserted') for key in new_keys)
+                outcomes.update((key, 'updated') for key in changed_keys)
+
+            touched = {key: keyed[key] for key in new_keys + changed_keys}
+            written.update(touched)
+            backfills = cumulative.assign(touched, set(new_keys))
+
+            new_rows = [
+                Dbbi(
+                    nom=keyed[key]['Nom'],
+                    date=keyed[key]['Date'],
+                    **typed_fields(keyed[key]),
+                    lookup_key=key,
+                    epoch_day=epoch_day(keyed[key]['Date']),
+                    employee_key=employee_index(keyed[key]['Nom']),
+                    content_hash=hashes[key],
+                )
+                for key in new_keys
+            ]
+            Dbbi.objects.bulk_create(new_rows, batch_size=batch_size)
+            aggregates.apply_records([keyed[key] for key in new_keys])
+            report.inserted += len(new_rows)
+
+            if changed_keys:
+                report.updated += _update_changed(keyed, hashes, changed_keys)
+
+            # Older days or changed rows: only the affected employees' later rows
+            for employee_key, from_day in backfills.items():
+                cumulative.recompute(employee_key, from_day, touched)
+
+        # bulk_create / bulk_update send no post_save signal
+        if report.saved:
+            transaction.on_commit(kpi_cache.bump_version)
+            if settings.ARCHIVE_ENABLED:
+                # The database stays the reference: a failed archive write is
+                # logged, rebuild_archive catches up
+                from myapp.services import archive
+                transaction.on_commit(partial(archive.append_records, written), robust=True)
+
+    for result, count in report.as_dict().items():
+        metrics.rows_saved.inc(count, result=result)
+    return report
+
+
+def _update_changed(keyed, hashes, changed_keys):
+    """Rewrite changed rows, only these are decrypted (to retract their old aggregate values)"""
+    rows = list(
+        Dbbi.objects.filter(lookup_key__in=changed_keys)
+        .values_list('id', 'lookup_key', *aggregates.ROW_FIELDS)
+    )
+    aggregates.retract_rows(row[2:] for row in rows)
+
+    # One UPDATE per row: bulk_update wraps values in CASE expressions, which
+    # the encrypted fields would encrypt as text instead of the values
+    for pk, lookup_key, *_ in rows:
+        Dbbi.objects.filter(pk=pk).update(content_hash=hashes[lookup_key], **typed_fields(keyed[lookup_key]))
+    aggregates.apply_records([keyed[lookup_key] for _, lookup_key, *_ in rows])
+    return len(rows)
+
+
+def file_fingerprint(file_obj):
+    """SHA-256 of an uploaded file's bytes, the file is rewound afterwards"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    if hasattr(file_obj, 'chunks'):
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: file_obj.read(1 << 20), b''):
+            digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def find_ingested(fingerprint):
+    """The IngestedFile already recorded for this fingerprint, or None"""
+    return IngestedFile.objects.filter(fingerprint=fingerprint).first()
+
+
+def record_ingested(fingerprint, file_name, file_size, rows, report):
+    """Remember a fully ingested file so the same bytes are short-circuited next time"""
+    IngestedFile.objects.update_or_create(
+        fingerprint=fingerprint,
+        defaults={
+            'file_name': file_name,
+            'file_size': file_size,
+            'rows': rows,
+            **report.as_dict(),
+        },
+    )
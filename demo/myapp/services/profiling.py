@@ -0,0 +1,154 @@
+import contextvars
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+# Upper bounds (ms) of the latency histogram buckets, the last one is open
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings of one request, filled by the middleware and the hooks below"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.decrypt_seconds = 0.0
+        self.decryptions = 0
+        self.render_seconds = 0.0
+        self.peak_bytes = None
+
+
+def current():
+    return _current.get()
+
+
+def activate(profile):
+    return _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper hook, counts and times every query"""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.db_seconds += time.perf_counter() - start
+
+
+_decrypt_installed = False
+
+
+def install_decrypt_timer():
+    """Time the encrypted fields' decrypt_str calls made during a profiled request"""
+    global _decrypt_installed
+    if _decrypt_installed:
+        return
+    from encrypted_model_fields import fields
+
+    decrypt_str = fields.decrypt_str
+
+    def timed_decrypt_str(value):
+        profile = _current.get()
+        if profile is None:
+            return decrypt_str(value)
+        start = time.perf_counter()
+        try:
+            return decrypt_str(value)
+        finally:
+            profile.decryptions += 1
+            profile.decrypt_seconds += time.perf_counter() - start
+
+    fields.decrypt_str = timed_decrypt_str
+    _decrypt_installed = True
+
+
+class Histogram:
+    """Last PROFILING_WINDOW requests per endpoint, summarized on demand"""
+
+    def __init__(self, window=None):
+        self.window = window or settings.PROFILING_WINDOW
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, profile, total_seconds):
+        sample = (
+            total_seconds * 1000,
+            profile.queries,
+            profile.db_seconds * 1000,
+            profile.decrypt_seconds * 1000,
+            profile.render_seconds * 1000,
+            profile.peak_bytes,
+        )
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(sample)
+
+    def summary(self):
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+        return {endpoint: _summarize(samples) for endpoint, samples in sorted(snapshot.items())}
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _summarize(samples):
+    totals = sorted(sample[0] for sample in samples)
+    buckets = {f"le_{bound}ms": 0 for bound in BUCKETS_MS}
+    buckets['inf'] = 0
+    for value in totals:
+        for bound in BUCKETS_MS:
+            if value <= bound:
+                buckets[f"le_{bound}ms"] += 1
+                break
+        else:
+            buckets['inf'] += 1
+
+    count = len(samples)
+    peaks = [sample[5] for sample in samples if sample[5] is not None]
+    return {
+        'count': count,
+        'p50_ms': round(_percentile(totals, 0.50), 2),
+        'p95_ms': round(_percentile(totals, 0.95), 2),
+        'p99_ms': round(_percentile(totals, 0.99), 2),
+        'max_ms': round(totals[-1], 2),
+        'avg_queries': round(sum(sample[1] for sample in samples) / count, 2),
+        'avg_db_ms': round(sum(sample[2] for sample in samples) / count, 2),
+        'avg_decrypt_ms': round(sum(sample[3] for sample in samples) / count, 2),
+        'avg_render_ms': round(sum(sample[4] for sample in samples) / count, 2),
+        'max_peak_bytes': max(peaks) if peaks else None,
+        'histogram': buckets,
+    }
+
+
+_histogram = None
+_histogram_lock = threading.Lock()
+
+
+def histogram():
+    global _histogram
+    with _histogram_lock:
+        if _histogram is None:
+            _histogram = Histogram()
+    return _histogram
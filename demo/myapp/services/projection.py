@@ -0,0 +1,29 @@
+from myapp.models import Dbbi
+
+DBBI_FIELDS = (
+    'id', 'nom', 'date', 'entree_seconds', 'sortie_seconds', 'travail_seconds', 'travail_cumulee_seconds', 'absent',
+)
+
+
+def _check(fields):
+    unknown = [f for f in fields if f not in DBBI_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown Dbbi fields: {unknown}. Available: {list(DBBI_FIELDS)}")
+
+
+def rows(fields, queryset=None, chunk_size=2000):
+    """
+    Yield plain tuples of the given Dbbi fields, in order, without building
+    model instances. Only these columns are fetched and decrypted.
+    """
+    fields = tuple(fields)
+    _check(fields)
+    queryset = Dbbi.objects.order_by('id') if queryset is None else queryset
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def records(fields, queryset=None, chunk_size=2000):
+    """Like rows() but yields {field: value} dicts (what DbbiSerializer accepts)"""
+    fields = tuple(fields)
+    for row in rows(fields, queryset, chunk_size=chunk_size):
+        yield dict(zip(fields, row))
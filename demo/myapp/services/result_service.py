@@ -1,44 +1,245 @@
+import atexit
+import hashlib
+import itertools
 import json
+import logging
+import queue
+import random
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 from myapp.models import FunctionResult
+from myapp.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Items of a list / dict looked at to estimate its serialized size
+_SAMPLE_ITEMS = 20
+_MAX_DEPTH = 4
+
+
+def _estimated_size(value, depth=0):
+    """
+    Rough JSON size of a value without serializing it: containers are
+    extrapolated from their first _SAMPLE_ITEMS items.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    if isinstance(value, (str, bytes)):
+        return len(value) + 2
+    if depth >= _MAX_DEPTH:
+        return 64
+    if isinstance(value, dict):
+        items = list(itertools.islice(value.items(), _SAMPLE_ITEMS))
+        sampled = sum(_estimated_size(k, depth + 1) + _estimated_size(v, depth + 1) + 4 for k, v in items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(itertools.islice(value, _SAMPLE_ITEMS))
+        sampled = sum(_estimated_size(item, depth + 1) + 2 for item in items)
+    else:
+        return 64  # str() of an arbitrary object
+    return int(sampled * len(value) / len(items)) + 2 if items else 2
+
+
+def _summary(value, size):
+    """Row count, hash and size of a result too large to store in full"""
+    if isinstance(value, pd.DataFrame):
+        hashed = pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes()
+        return {
+            'type': 'DataFrame',
+            'rows': len(value),
+            'columns': [str(c) for c in value.columns],
+            'sha256': hashlib.sha256(hashed).hexdigest(),
+            'size_bytes': int(value.memory_usage(index=False).sum()),
+        }
+    return {
+        'type': type(value).__name__,
+        'rows': len(value) if hasattr(value, '__len__') else None,
+        'estimated_bytes': size,
+    }
+
+
+def describe(value):
+    """
+    JSON-safe value for the audit trail: small values as they are, DataFrames
+    and anything larger than AUDIT_MAX_RESULT_BYTES as a summary. The size is
+    estimated from a sample first, only values that look small are serialized.
+    """
+    if value is None:
+        return None
+    if isinstance(value, pd.DataFrame):
+        return _summary(value, None)
+    size = _estimated_size(value)
+    if size > settings.AUDIT_MAX_RESULT_BYTES:
+        return _summary(value, size)
+    text = json.dumps(value, default=str, ensure_ascii=False)
+    if len(text) > settings.AUDIT_MAX_RESULT_BYTES:
+        return _summary(value, len(text))
+    return value
+
+
+class _Measure:
+    """
+    Wall time, CPU time and (with AUDIT_TRACEMALLOC) peak memory of one
+    wrapped call. CPU time is the calling thread's: the process total would
+    include the audit writer, the ingestion pool and other requests.
+    """
+
+    def __enter__(self):
+        self.traced = settings.AUDIT_TRACEMALLOC and not tracemalloc.is_tracing()
+        if self.traced:
+            tracemalloc.start()
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_time_ms = (time.perf_counter() - self.wall) * 1000
+        self.cpu_time_ms = (time.thread_time() - self.cpu) * 1000
+        # Only tracemalloc measures this call; ru_maxrss is the process's
+        # lifetime high-water mark, so without it nothing is stored
+        self.peak_memory_bytes = None
+        if self.traced:
+            self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return False
+
+
+_STOP = object()
+
+
+class AuditQueue:
+    """
+    In-memory queue of FunctionResult rows written with bulk_create by a
+    background thread, so the request path never waits on the audit insert.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.failed = 0
+
+    def put(self, record):
+        self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.function_result_dropped.inc()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            deadline = time.monotonic() + settings.AUDIT_FLUSH_INTERVAL
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= settings.AUDIT_BATCH_SIZE or timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            FunctionResult.objects.bulk_create(batch)
+        except Exception:
+            self.failed += len(batch)
+            metrics.function_result_write_failures.inc(len(batch), mode='async')
+            logger.exception("Failed to save %d function results", len(batch))
+        finally:
+            connection.close()
+
+    def close(self, timeout=5.0):
+        """Write everything still queued and stop the writer (used at exit)"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+
+_audit_queue = None
+_audit_queue_lock = threading.Lock()
+
+
+def audit_queue():
+    global _audit_queue
+    with _audit_queue_lock:
+        if _audit_queue is None:
+            _audit_queue = AuditQueue()
+            atexit.register(_audit_queue.close)
+    return _audit_queue
+
 
 class ResultService:
     @staticmethod
-    def save_function_result(func, args, kwargs, result, success=True, error=None):
+    def save_function_result(func, args, kwargs, result, success=True, error=None, measure=None):
         """
-        Save function execution results to database
+        Save function execution results (queued unless AUDIT_ASYNC is off)
         """
         try:
-            # Convert complex objects to strings for storage
-            args_str = json.dumps([str(arg) for arg in args])
-            kwargs_str = json.dumps({k: str(v) for k, v in kwargs.items()})
-            
-            FunctionResult.objects.create(
+            record = FunctionResult(
                 function_name=func.__name__,
-                arguments=args_str,
-                result=json.dumps(result) if success and result is not None else None,
+                arguments=json.dumps({
+                    'args': [describe(arg) for arg in args],
+                    'kwargs': {k: describe(v) for k, v in kwargs.items()},
+                }, default=str, ensure_ascii=False),
+                result=json.dumps(describe(result), default=str, ensure_ascii=False) if success and result is not None else None,
                 success=success,
                 error_message=str(error)[:500] if error else None,  # Limit error length
-                executed_at=timezone.now()
+                executed_at=timezone.now(),
+                wall_time_ms=getattr(measure, 'wall_time_ms', None),
+                cpu_time_ms=getattr(measure, 'cpu_time_ms', None),
+                peak_memory_bytes=getattr(measure, 'peak_memory_bytes', None),
             )
-        except Exception as e:
-            # Log the error but don't break the main function
-            print(f"Failed to save function result: {e}")
+            if settings.AUDIT_ASYNC:
+                audit_queue().put(record)
+            else:
+                record.save()
+        except Exception:
+            # Count and log the error but don't break the main function
+            metrics.function_result_write_failures.inc(mode='sync')
+            logger.exception("Failed to save function result of %s", func.__name__)
 
 def post(func):
     """
-    Decorator to automatically save function results to database
+    Decorator to record function results (timings, memory, result summary)
+    in the FunctionResult audit trail. Successful calls are sampled with
+    AUDIT_SAMPLE_RATE, failures are always recorded.
     """
-    from functools import wraps
-    
     @wraps(func)
     def wrapper(*args, **kwargs):
+        measure = _Measure()
         try:
-            result = func(*args, **kwargs)
-            ResultService.save_function_result(func, args, kwargs, result, success=True)
-            return result
+            with measure:
+                result = func(*args, **kwargs)
         except Exception as e:
-            ResultService.save_function_result(func, args, kwargs, None, success=False, error=e)
+            ResultService.save_function_result(func, args, kwargs, None, success=False, error=e, measure=measure)
             raise e
-    
-    return wrapper
\ No newline at end of file
+
+        if random.random() < settings.AUDIT_SAMPLE_RATE:
+            ResultService.save_function_result(func, args, kwargs, result, success=True, measure=measure)
+        return result
+
+    return wrapper
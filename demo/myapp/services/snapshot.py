@@ -0,0 +1,120 @@
+import sys
+import time
+from array import array
+
+import numpy as np
+
+from myapp.services import projection
+from myapp.services.blind_index import epoch_day, normalize_nom
+from myapp.services.kpi import KpiResult
+
+FIELDS = ('nom', 'date', 'travail_seconds', 'absent')
+
+# Bits of DbbiSnapshot.flags
+WORKED = 1
+ABSENT = 2
+
+
+class DbbiSnapshot:
+    """
+    Decrypted, columnar copy of the Dbbi table for offline analytics (the
+    build_snapshot, parallel_scan and archive commands); the API KPIs come
+    from the daily aggregates. One entry per row in aligned NumPy arrays:
+    employee (index into noms), day (epoch days), worked (seconds) and
+    flags (WORKED / ABSENT bits).
+    """
+
+    def __init__(self, noms, employee, day, worked, flags, build_seconds):
+        self.noms = noms
+        self.employee = employee
+        self.day = day
+        self.worked = worked
+        self.flags = flags
+        self.build_seconds = build_seconds
+
+    def __len__(self):
+        return len(self.employee)
+
+    @property
+    def absent(self):
+        return (self.flags & ABSENT) != 0
+
+    @property
+    def present(self):
+        return (self.flags & WORKED) != 0
+
+    @property
+    def nbytes(self):
+        arrays = self.employee.nbytes + self.day.nbytes + self.worked.nbytes + self.flags.nbytes
+        return arrays + sum(sys.getsizeof(nom) for nom in self.noms)
+
+    def weekday(self):
+        """ISO weekday index of every row, 0 (Lun) to 6 (Dim); 1970-01-01 was a Thursday"""
+        return (self.day + 3) % 7
+
+    def kpis(self, start=None, end=None):
+        """KpiResult over the rows whose day is within [start, end] (dates, inclusive)"""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.day >= epoch_day(start)
+        if end is not None:
+            mask &= self.day <= epoch_day(end)
+
+        employee = self.employee[mask]
+        flags = self.flags[mask]
+        worked = self.worked[mask].astype(np.int64)
+        weekday = self.weekday()[mask]
+
+        n = len(self.noms)
+        seen = np.flatnonzero(np.bincount(employee, minlength=n))
+        return KpiResult(
+            [self.noms[i] for i in seen],
+            np.bincount(employee, weights=worked, minlength=n).astype(np.int64)[seen],
+            np.bincount(employee, weights=(flags & WORKED) != 0, minlength=n).astype(np.int64)[seen],
+            np.bincount(employee, weights=(flags & ABSENT) != 0, minlength=n).astype(np.int64)[seen],
+            np.bincount(weekday, weights=worked, minlength=7).astype(np.int64),
+            np.bincount(weekday, minlength=7).astype(np.int64),
+        )
+
+    def stats(self):
+        return {
+            'rows': len(self),
+            'employees': len(self.noms),
+            'memory_bytes': self.nbytes,
+            'build_seconds': round(self.build_seconds, 3),
+        }
+
+
+def build_snapshot(chunk_size=2000):
+    """Decrypt the columns the analytics need (nom, date, worked seconds, absence) once"""
+    start = time.perf_counter()
+    index = {}
+    noms = []
+    employee = array('i')
+    day = array('i')
+    worked = array('i')
+    flags = array('B')
+
+    for nom, date, seconds, absent in projection.rows(FIELDS, chunk_size=chunk_size):
+        nom = sys.intern(normalize_nom(nom))
+        if nom not in index:
+            index[nom] = len(noms)
+            noms.append(nom)
+        employee.append(index[nom])
+        day.append(epoch_day(date))
+        if seconds is not None:
+            worked.append(seconds)
+            flags.append(WORKED)
+        else:
+            worked.append(0)
+            flags.append(ABSENT if absent else 0)
+
+    return DbbiSnapshot(
+        noms,
+        np.frombuffer(employee, dtype=np.int32),
+        np.frombuffer(day, dtype=np.int32),
+        np.frombuffer(worked, dtype=np.int32),
+        np.frombuffer(flags, dtype=np.uint8),
+        time.perf_counter() - start,
+    )
+
@@ -0,0 +1,120 @@
+import pandas as pd
+from django.conf import settings
+
+from myapp.services.myapp import (
+    OUTPUT_COLUMNS,
+    compute_cumulative,
+    extract_attendance,
+    running_totals,
+    validate_columns,
+)
+from myapp.services import metrics
+from myapp.services.persistence import SaveReport, bulk_save
+
+
+def _iter_xlsx_rows(file_obj):
+    """Rows of the first sheet, openpyxl read-only mode (cells are not kept in memory)"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xls_value(cell, datemode):
+    import xlrd
+
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        value = xlrd.xldate_as_datetime(cell.value, datemode)
+        # Same as pandas: a date cell without a date part is a time
+        return value.time() if cell.value < 1 else value
+    if cell.ctype == xlrd.XL_CELL_NUMBER and cell.value.is_integer():
+        return int(cell.value)
+    return cell.value
+
+
+def _iter_xls_rows(file_obj):
+    """
+    Rows of the first sheet of a legacy .xls. xlrd has no streaming mode,
+    on_demand only loads the sheet being read, rows are converted lazily.
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(file_contents=file_obj.read(), on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            yield [_xls_value(cell, book.datemode) for cell in sheet.row(index)]
+    finally:
+        book.release_resources()
+
+
+def iter_sheet_chunks(file_obj, chunk_rows=None):
+    """
+    Yield the first sheet as DataFrames of at most chunk_rows rows, with the
+    header row as column names. Peak memory depends on chunk_rows, not on
+    the size of the workbook.
+    """
+    chunk_rows = chunk_rows or settings.INGESTION_CHUNK_ROWS
+    file_name = getattr(file_obj, 'name', '').lower()
+    rows = _iter_xls_rows(file_obj) if file_name.endswith('.xls') else _iter_xlsx_rows(file_obj)
+
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("Le fichier Excel est vide")
+    header = list(header)
+    validate_columns(header)
+
+    chunk = []
+    for row in rows:
+        if not any(value is not None for value in row):
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield pd.DataFrame(chunk, columns=header)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header)
+
+
+def ingest_stream(file_obj, chunk_rows=None, progress=None, persist=True):
+    """
+    Read, compute and persist a workbook chunk by chunk. 'Travail Cumulée'
+    continues across chunks through the running totals, which matches the
+    whole-file computation when each employee's rows come in date order
+    (chronological exports). Each chunk is committed on its own.
+    progress(rows_parsed, rows_saved, report) is called after each chunk.
+    Returns (rows_parsed, report), report being the summed SaveReport.
+    """
+    totals = {}
+    rows_parsed = 0
+    rows_saved = 0
+    report = SaveReport()
+
+    chunks = iter_sheet_chunks(file_obj, chunk_rows)
+    while True:
+        with metrics.ingestion_stage_seconds.time(stage='read'):
+            raw = next(chunks, None)
+        if raw is None:
+            break
+        with metrics.ingestion_stage_seconds.time(stage='compute'):
+            extracted = extract_attendance(raw)
+            chunk = compute_cumulative(extracted, totals)[OUTPUT_COLUMNS]
+            totals = running_totals(extracted, totals)
+        rows_parsed += len(chunk)
+        metrics.rows_parsed.inc(len(chunk), path='stream')
+        if progress:
+            progress(rows_parsed, rows_saved, report)
+
+        if persist:
+            with metrics.ingestion_stage_seconds.time(stage='persist'):
+                report.add(bulk_save(chunk.to_dict('records')))
+            rows_saved = rows_parsed
+            if progress:
+                progress(rows_parsed, rows_saved, report)
+
+    return rows_parsed, report
@@ -0,0 +1,65 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+
+def synthetic_sheet(employees=50, days=30, absence_rate=0.1, seed=0,
+                    start=datetime.date(2024, 1, 1), first_employee=0):
+    """
+    Build a raw attendance sheet in the badge export layout
+    ('Entrée.', 'Sortie.', 'Nom.', 'Date.'), one row per employee per day.
+    Absent days have empty Entrée./Sortie. cells.
+    """
+    rng = np.random.default_rng(seed)
+    rows = employees * days
+
+    noms = np.repeat([f"Employe {i:05}" for i in range(first_employee, first_employee + employees)], days)
+    dates = pd.date_range(start, periods=days, freq='D').strftime('%d/%m/%Y')
+    dates = np.tile(dates.to_numpy(dtype=object), employees)
+
+    # Entry between 07:00 and 10:00, 6h to 10h of work
+    entree_s = rng.integers(7 * 3600, 10 * 3600, rows)
+    sortie_s = entree_s + rng.integers(6 * 3600, 10 * 3600, rows)
+    base = pd.Timestamp('1900-01-01')
+    entree = (base + pd.to_timedelta(entree_s, unit='s')).strftime('%H:%M:%S').to_numpy(dtype=object)
+    sortie = (base + pd.to_timedelta(sortie_s, unit='s')).strftime('%H:%M:%S').to_numpy(dtype=object)
+
+    absent = rng.random(rows) < absence_rate
+    entree[absent] = None
+    sortie[absent] = None
+
+    # Badge exports are not sorted by employee
+    order = rng.permutation(rows)
+    return pd.DataFrame({
+        'Entrée.': entree[order],
+        'Sortie.': sortie[order],
+        'Nom.': noms[order],
+        'Date.': dates[order],
+    })
+
+
+def write_synthetic_workbook(path, employees=50, days=30, absence_rate=0.1, seed=0, batch_employees=100):
+    """
+    Write a synthetic .xlsx with openpyxl write-only mode, generating
+    batch_employees employees at a time so large workbooks fit in memory.
+    Returns the number of data rows.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['Entrée.', 'Sortie.', 'Nom.', 'Date.'])
+    rows = 0
+    for first in range(0, employees, batch_employees):
+        batch = synthetic_sheet(
+            employees=min(batch_employees, employees - first),
+            days=days,
+            absence_rate=absence_rate,
+            seed=seed + first,
+            first_employee=first,
+        )
+        for row in batch.itertuples(index=False):
+            sheet.append(list(row))
+        rows += len(batch)
+    workbook.save(path)
+    return rows
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from myapp.models import Dbbi
+from myapp.services import aggregates, cumulative, kpi_cache
+from myapp.services.blind_index import employee_index, epoch_day
+
+# Rows written one by one (admin, DbbiViewSet, Dbbi.save()). bulk_save keeps
+# the aggregates itself and sends no signal.
+
+
+def _stored_values(instance):
+    return tuple(getattr(instance, field) for field in aggregates.ROW_FIELDS)
+
+
+def _recompute_cumulative(rows):
+    """Rewrite Travail Cumulée and the running totals of the employees of these rows from their earliest day"""
+    from_days = {}
+    for nom, date, *_ in rows:
+        key, day = employee_index(nom), epoch_day(date)
+        from_days[key] = min(day, from_days.get(key, day))
+    for key, day in from_days.items():
+        cumulative.recompute(key, day)
+
+
+@receiver(pre_save, sender=Dbbi)
+def remember_stored_values(sender, instance, **kwargs):
+    """Values an existing row had before this save, retracted in post_save"""
+    instance._stored_values = None
+    if instance.pk is not None:
+        instance._stored_values = (
+            Dbbi.objects.filter(pk=instance.pk).values_list(*aggregates.ROW_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Dbbi)
+def update_aggregates_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_stored_values', None)
+    current = _stored_values(instance)
+    with transaction.atomic():
+        kpi_cache.lock_writes()
+        if previous is not None:
+            aggregates.retract_rows([previous])
+        aggregates.apply_rows([current])
+        _recompute_cumulative([row for row in (previous, current) if row is not None])
+    # Any Dbbi write makes the cached KPIs stale
+    transaction.on_commit(kpi_cache.bump_version)
+
+
+@receiver(post_delete, sender=Dbbi)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    values = _stored_values(instance)
+    with transaction.atomic():
+        kpi_cache.lock_writes()
+        aggregates.retract_rows([values])
+        _recompute_cumulative([values])
+    transaction.on_commit(kpi_cache.bump_version)
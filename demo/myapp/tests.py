@@ -1,3 +1,857 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from cryptography.fernet import Fernet
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from encrypted_model_fields.fields import get_crypter
+
+from myapp.models import DailyAggregate, Dbbi, FunctionResult, IngestionJob, RunningTotal
+from myapp.serializers import DbbiSerializer
+from myapp.services import kpi_cache, parallel_scan, snapshot
+from myapp.services.blind_index import blind_index, employee_index
+from myapp.services.durations import parse_seconds
+from myapp.services.kpi import compute_kpis
+from myapp.services.myapp import (
+    OUTPUT_COLUMNS,
+    _compute_cumulative_rowwise,
+    _extract_attendance_rowwise,
+    build_attendance,
+    compute_cumulative,
+    extract_attendance,
+    running_totals,
+)
+from myapp.services.period import Period
+from myapp.services.persistence import bulk_save
+from myapp.services.result_service import describe, post
+from myapp.services.streaming import ingest_stream, iter_sheet_chunks
+from myapp.services.synthetic import synthetic_sheet
+
+BLIND_INDEX_KEY = 'test-blind-index-key'
+
+
+def record(nom, day, entree='08:00:00', sortie='16:00:00', travail='08:00:00'):
+    """A parsed attendance record as build_attendance returns it (January 2024)"""
+    return {
+        'Nom': nom,
+        'Date': datetime.date(2024, 1, day),
+        'Entrée': entree,
+        'Sortie': sortie,
+        'Travail': travail,
+        'Travail Cumulée': None,
+    }
+
+
+def workbook(name, sheets):
+    """An uploaded .xlsx file of {sheet name: DataFrame}"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        for sheet, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet, index=False)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def kpi_values(result):
+    """Comparable content of a KpiResult"""
+    return {
+        'employees': sorted(result.employees()),
+        'weekly': result.weekly(),
+        'days_present': result.days_present,
+        'total_records': result.total_records,
+    }
+
+
+def temporary_directory(test):
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory, True)
+    return directory
+
+
+class ColumnarParseTests(SimpleTestCase):
+
+    def test_same_result_as_rowwise(self):
+        sheet = pd.concat([
+            synthetic_sheet(employees=5, days=40, absence_rate=0.2, seed=3),
+            pd.DataFrame({
+                'Entrée.': ['08:00:00', None, '09:15', '22:00:00'],
+                'Sortie.': ['17:30:00', '12:00:00', '18:00:00', '06:30:00'],
+                'Nom.': ['Employe 00001', 'Employe 00002', 'Employe 00003', 'Employe 00004'],
+                'Date.': ['', '01/03/2024', '02/03/2024', '03/03/2024'],  # no date, half absent, HH:MM, overnight
+            }),
+        ], ignore_index=True)
+
+        rowwise = pd.DataFrame(_compute_cumulative_rowwise(_extract_attendance_rowwise(sheet)), columns=OUTPUT_COLUMNS)
+        columnar = compute_cumulative(extract_attendance(sheet))[OUTPUT_COLUMNS]
+        pd.testing.assert_frame_equal(columnar, rowwise)
+
+    def test_overnight_shift(self):
+        sheet = pd.DataFrame({
+            'Entrée.': ['22:00:00', '08:00:00'],
+            'Sortie.': ['06:30:00', '08:00:00'],
+            'Nom.': ['Nuit', 'Nuit'],
+            'Date.': ['01/03/2024', '02/03/2024'],
+        })
+        self.assertEqual(list(extract_attendance(sheet)['Travail']), ['08:30:00', '00:00:00'])
+
+
+class CumulativeTests(SimpleTestCase):
+
+    def test_previous_totals_continue_the_sum(self):
+        sheet = extract_attendance(synthetic_sheet(employees=4, days=20, absence_rate=0.2, seed=5))
+        dates = pd.to_datetime(sheet['Date'])
+        first, second = sheet[dates < dates.median()], sheet[dates >= dates.median()]
+
+        whole = compute_cumulative(sheet.copy())
+        continued = compute_cumulative(second.copy(), running_totals(first))
+        expected = whole[pd.to_datetime(whole['Date']) >= dates.median()].reset_index(drop=True)
+        pd.testing.assert_series_equal(continued['Travail Cumulée'], expected['Travail Cumulée'])
+
+    def test_formatted_like_timedelta(self):
+        sheet = pd.DataFrame({
+            'Nom': ['A', 'A', 'B'],
+            'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-01']).date,
+            'Travail': ['10:00:00', 'Abs', '08:30:00'],
+        })
+        result = compute_cumulative(sheet, {'A': 86400})
+        self.assertEqual(list(result['Travail Cumulée']), ['1 day, 10:00:00', '1 day, 10:00:00', '8:30:00'])
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class BulkSaveTests(TestCase):
+
+    def test_upsert_on_lookup_key(self):
+        report = bulk_save([
+            record('Alice', 1),
+            record('Alice', 2),
+            record('Alice', 1, travail='07:00:00'),  # same (nom, date), the first one wins
+            {'Nom': None, 'Date': datetime.date(2024, 1, 3)},
+        ])
+        self.assertEqual(report.as_dict(), {'inserted': 2, 'updated': 0, 'skipped': 2})
+
+        bulk_save([record(' Alice ', 1, sortie='17:00:00', travail='09:00:00')])
+        self.assertEqual(Dbbi.objects.count(), 2)
+        row = Dbbi.objects.get(lookup_key=blind_index('Alice', datetime.date(2024, 1, 1)))
+        self.assertEqual(row.nom, 'Alice')
+        self.assertEqual(row.travail_seconds, 9 * 3600)
+
+
+class DurationTests(SimpleTestCase):
+
+    def test_parse_seconds(self):
+        self.assertEqual(parse_seconds('08:30:15'), 8 * 3600 + 30 * 60 + 15)
+        self.assertEqual(parse_seconds('8:30'), 8 * 3600 + 30 * 60)
+        self.assertEqual(parse_seconds('2 days, 3:15:00'), 2 * 86400 + 3 * 3600 + 15 * 60)
+        # Floor-divided negative Travail, and str() of a negative timedelta
+        self.assertEqual(parse_seconds('-16:30:00'), -16 * 3600 + 30 * 60)
+        self.assertEqual(parse_seconds(str(datetime.timedelta(hours=-16))), -16 * 3600)
+        for value in ('Abs', '', None, '8h30', '-'):
+            self.assertIsNone(parse_seconds(value))
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class DbbiSerializerTests(TestCase):
+
+    def round_trip(self, **values):
+        serializer = DbbiSerializer(data={'nom': 'Ana', 'date': '2024-01-05T00:00:00', **values})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        row = serializer.save()
+        return DbbiSerializer(Dbbi.objects.get(pk=row.pk)).data
+
+    def test_worked_day(self):
+        data = self.round_trip(entree='08:00:00', sortie='16:30', travail='08:30:00')
+        # travail_cumulee is recomputed from the employee's history on save
+        self.assertEqual(
+            (data['entree'], data['sortie'], data['travail'], data['travail_cumulee']),
+            ('08:00:00', '16:30:00', '08:30:00', '8:30:00'),
+        )
+        row = Dbbi.objects.get()
+        self.assertEqual((row.travail_seconds, row.absent), (8 * 3600 + 30 * 60, False))
+
+    def test_cumulative_format(self):
+        field = DbbiSerializer().fields['travail_cumulee']
+        self.assertEqual(field.to_internal_value('1 day, 2:00:00'), {'travail_cumulee_seconds': 26 * 3600})
+        self.assertEqual(field.to_representation(Dbbi(travail_cumulee_seconds=26 * 3600)), '1 day, 2:00:00')
+
+    def test_absent_day(self):
+        data = self.round_trip(entree='Abs', sortie='Abs', travail='Abs')
+        self.assertEqual(
+            (data['entree'], data['sortie'], data['travail'], data['travail_cumulee']),
+            ('Abs', 'Abs', 'Abs', '0:00:00'),
+        )
+        row = Dbbi.objects.get()
+        self.assertEqual((row.travail_seconds, row.absent), (None, True))
+
+    def test_invalid_durations(self):
+        for value in ('8h', '-16:00:00'):
+            serializer = DbbiSerializer(data={'nom': 'Ana', 'date': '2024-01-05T00:00:00', 'travail': value})
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('travail', serializer.errors)
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class OvernightRepairTests(TestCase):
+
+    def test_travail_recomputed_from_entree_and_sortie(self):
+        bulk_save([record('Nuit', 1, entree='22:00:00', sortie='06:00:00', travail='08:00:00')])
+        row = Dbbi.objects.get()
+        stored_hash = row.content_hash
+        # As left by 0015 before it parsed negative durations
+        Dbbi.objects.filter(pk=row.pk).update(travail_seconds=None, content_hash=None)
+
+        migration = importlib.import_module('myapp.migrations.0018_repair_overnight_travail')
+        migration.repair_overnight_travail(django_apps, None)
+
+        row.refresh_from_db()
+        self.assertEqual((row.travail_seconds, row.absent, row.content_hash), (8 * 3600, False, stored_hash))
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class SingleRowWriteTests(TestCase):
+    """Rows written one by one (admin, Dbbi.save()) keep the aggregates and running totals in sync"""
+
+    def setUp(self):
+        bulk_save([record('Gus', day) for day in (1, 2, 3)])
+        self.key = employee_index('Gus')
+
+    def worked(self):
+        return dict(DailyAggregate.objects.filter(employee_key=self.key).values_list('day__day', 'worked_seconds'))
+
+    def cumulated(self):
+        return list(Dbbi.objects.order_by('epoch_day').values_list('travail_cumulee_seconds', flat=True))
+
+    def test_save(self):
+        row = Dbbi.objects.get(lookup_key=blind_index('Gus', datetime.date(2024, 1, 2)))
+        row.travail_seconds = 4 * 3600
+        row.save()
+        self.assertEqual(self.worked(), {1: 8 * 3600, 2: 4 * 3600, 3: 8 * 3600})
+        self.assertEqual(self.cumulated(), [8 * 3600, 12 * 3600, 20 * 3600])
+
+        Dbbi(nom='Gus', date=datetime.date(2024, 1, 4), travail_seconds=3600).save()
+        self.assertEqual(self.worked()[4], 3600)
+        self.assertEqual(RunningTotal.objects.get(employee_key=self.key).cumulative_seconds, 21 * 3600)
+
+    def test_delete(self):
+        Dbbi.objects.get(lookup_key=blind_index('Gus', datetime.date(2024, 1, 1))).delete()
+        self.assertEqual(self.worked(), {2: 8 * 3600, 3: 8 * 3600})
+        self.assertEqual(self.cumulated(), [8 * 3600, 16 * 3600])
+        self.assertEqual(RunningTotal.objects.get(employee_key=self.key).cumulative_seconds, 16 * 3600)
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class KpiCacheTests(TestCase):
+    url = '/api/dashboard-summary/'
+
+    def test_not_modified_on_matching_etag(self):
+        bulk_save([record('Dan', 1)])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A write bumps the dataset version, the old ETag no longer matches
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_save([record('Dan', 2)])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalidated_entries_counted_once(self):
+        before = kpi_cache.stats()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        kpi_cache.bump_version()
+        self.client.get(self.url)
+
+        after = kpi_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['invalidated'] - before['invalidated'], 1)
+        self.assertEqual(list(kpi_cache._stored_for_version), [after['version']])
+
+
+class IngestionJobTests(TransactionTestCase):
+    """parse-excel with async=1: the workbook is processed by the local worker pool"""
+
+    def setUp(self):
+        self.upload_dir = temporary_directory(self)
+        settings_override = override_settings(
+            BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False, INGESTION_UPLOAD_DIR=self.upload_dir,
+            INGESTION_CHUNK_ROWS=7,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def submit(self, upload):
+        response = self.client.post('/api/dbbi/parse-excel/', {'file': upload, 'async': '1'})
+        self.assertEqual(response.status_code, 202)
+        url = response.json()['status_url']
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            job = self.client.get(url).json()
+            if job['status'] in (IngestionJob.DONE, IngestionJob.FAILED):
+                return job
+            time.sleep(0.05)
+        self.fail("Ingestion job did not finish")
+
+    def test_job_saves_in_chunks(self):
+        job = self.submit(workbook('jobs.xlsx', {'sheet': synthetic_sheet(3, 10, seed=7)}))
+        self.assertEqual(job['status'], IngestionJob.DONE)
+        self.assertEqual((job['rows_parsed'], job['rows_saved'], job['inserted']), (30, 30, 30))
+        self.assertEqual(Dbbi.objects.count(), 30)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_failed_job(self):
+        upload = workbook('bad.xlsx', {'sheet': pd.DataFrame({'Nom.': ['A']})})
+        with self.assertLogs('myapp.services.jobs', 'ERROR'):
+            job = self.submit(upload)
+        self.assertEqual(job['status'], IngestionJob.FAILED)
+        self.assertIn('Colonnes requises manquantes', job['error'])
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class StreamingTests(TestCase):
+
+    def setUp(self):
+        # Chronological export, the order streaming relies on for Travail Cumulée
+        sheet = synthetic_sheet(4, 12, absence_rate=0.2, seed=8)
+        self.sheet = sheet.iloc[pd.to_datetime(sheet['Date.'], format='%d/%m/%Y').argsort(kind='stable')]
+        self.upload = workbook('stream.xlsx', {'sheet': self.sheet})
+
+    def test_chunks_match_whole_file(self):
+        chunks = list(iter_sheet_chunks(self.upload, chunk_rows=7))
+        self.assertEqual([len(chunk) for chunk in chunks], [7] * 6 + [6])
+        pd.testing.assert_frame_equal(
+            extract_attendance(pd.concat(chunks, ignore_index=True)),
+            extract_attendance(self.sheet.reset_index(drop=True)),
+        )
+
+    def test_cumulative_matches_whole_file(self):
+        rows_parsed, report = ingest_stream(self.upload, chunk_rows=7)
+        self.assertEqual((rows_parsed, report.inserted), (48, 48))
+
+        whole = build_attendance(self.sheet)
+        expected = {
+            blind_index(nom, date): parse_seconds(cumul)
+            for nom, date, cumul in whole[['Nom', 'Date', 'Travail Cumulée']].itertuples(index=False)
+        }
+        stored = dict(Dbbi.objects.values_list('lookup_key', 'travail_cumulee_seconds'))
+        self.assertEqual(stored, expected)
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class KeysetPagingTests(TestCase):
+
+    def test_cursor_round_trip(self):
+        bulk_save([record('Carol', day) for day in range(1, 6)])
+        ids = list(Dbbi.objects.order_by('id').values_list('id', flat=True))
+
+        seen = []
+        url = '/api/dbbi/all/?limit=2&fields=nom'
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            self.assertEqual(set(data['results'][0]), {'id', 'nom'})
+            url = data['next']
+        self.assertEqual(seen, ids)
+
+        data = self.client.get(f'/api/dbbi/all/?limit=2&after={ids[3]}').json()
+        self.assertEqual([row['id'] for row in data['results']], ids[4:])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_stream(self):
+        bulk_save([record('Carol', day) for day in range(1, 4)])
+        response = self.client.get('/api/dbbi/all/?stream=1&fields=nom,travail')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([set(row) for row in rows], [{'id', 'nom', 'travail'}] * 3)
+        self.assertEqual(rows[0]['travail'], '08:00:00')
+
+
+@override_settings(AUDIT_ASYNC=False, AUDIT_SAMPLE_RATE=1.0, AUDIT_MAX_RESULT_BYTES=1000, AUDIT_TRACEMALLOC=False)
+class AuditTrailTests(TestCase):
+
+    def test_describe(self):
+        self.assertEqual(describe({'rows': [1, 2, 3]}), {'rows': [1, 2, 3]})
+
+        summary = describe([{'Nom': 'Employe', 'Travail': '08:00:00'}] * 1000)
+        self.assertEqual((summary['type'], summary['rows']), ('list', 1000))
+        self.assertGreater(summary['estimated_bytes'], 1000)
+
+        summary = describe(pd.DataFrame({'a': [1, 2]}))
+        self.assertEqual((summary['type'], summary['rows'], summary['columns']), ('DataFrame', 2, ['a']))
+        self.assertEqual(summary, describe(pd.DataFrame({'a': [1, 2]})))
+
+    def test_sampling_keeps_failures(self):
+        @post
+        def double(value):
+            if value < 0:
+                raise ValueError("negative")
+            return value * 2
+
+        with override_settings(AUDIT_SAMPLE_RATE=0.0):
+            self.assertEqual(double(2), 4)
+            with self.assertRaises(ValueError):
+                double(-1)
+        double(3)
+
+        recorded = list(FunctionResult.objects.order_by('id').values_list('success', 'result', 'error_message'))
+        self.assertEqual(recorded, [(False, None, 'negative'), (True, '6', None)])
+
+    def test_cpu_time_of_the_calling_thread(self):
+        @post
+        def wait():
+            time.sleep(0.2)
+
+        stop = threading.Event()
+
+        def busy():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy)
+        thread.start()
+        try:
+            wait()
+        finally:
+            stop.set()
+            thread.join()
+
+        result = FunctionResult.objects.get()
+        self.assertGreaterEqual(result.wall_time_ms, 200)
+        self.assertLess(result.cpu_time_ms, 100)
+        self.assertIsNone(result.peak_memory_bytes)
+
+    def test_failed_write_logged(self):
+        @post
+        def double(value):
+            return value * 2
+
+        with mock.patch.object(FunctionResult, 'save', side_effect=RuntimeError("database is gone")):
+            with self.assertLogs('myapp.services.result_service', 'ERROR') as logs:
+                self.assertEqual(double(2), 4)
+        self.assertIn('Failed to save function result of double', logs.output[0])
+        self.assertIn('database is gone', logs.output[0])
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class SnapshotTests(TestCase):
+
+    def test_kpis_match_the_aggregates(self):
+        bulk_save([record('Hana', 1), record('Hana', 2, travail='Abs'), record('Ivo', 2, travail='06:30:00')])
+        snap = snapshot.build_snapshot()
+        self.assertEqual(snap.stats()['rows'], 3)
+        self.assertEqual(kpi_values(snap.kpis()), kpi_values(compute_kpis()))
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class PeriodFilterTests(TestCase):
+    url = '/api/heures-realisees/'
+
+    def setUp(self):
+        bulk_save([record('Jo', day, travail='01:00:00') for day in (1, 2, 3)] + [record('Kim', 2, travail='02:00:00')])
+
+    def total(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['total_seconds'] // 3600
+
+    def test_filters(self):
+        self.assertEqual(self.total(''), 5)
+        self.assertEqual(self.total('start=2024-01-02'), 4)
+        self.assertEqual(self.total('end=2024-01-02'), 4)
+        self.assertEqual(self.total('start=2024-01-02&end=2024-01-02'), 3)
+        self.assertEqual(self.total('nom=Jo'), 3)
+        self.assertEqual(self.total('nom=%20Kim%20&start=2024-01-02'), 2)
+        self.assertEqual(self.total('nom=Nobody'), 0)
+
+        period = Period(datetime.date(2024, 1, 2), None, 'Jo')
+        self.assertEqual(period.filter_dbbi(Dbbi.objects.all()).count(), 2)
+
+    def test_invalid(self):
+        for query in ('start=2024-13-01', 'start=yesterday', 'start=2024-01-03&end=2024-01-01'):
+            response = self.client.get(f'{self.url}?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False, AUDIT_ASYNC=False)
+class IncrementalUploadTests(TestCase):
+
+    def test_unchanged_rows_skipped(self):
+        bulk_save([record('Alice', 1), record('Alice', 2)])
+
+        outcomes = {}
+        report = bulk_save([
+            record('Alice', 1),
+            record('Alice', 2, sortie='17:00:00', travail='09:00:00'),
+            record('Alice', 3),
+        ], outcomes=outcomes)
+        self.assertEqual(report.as_dict(), {'inserted': 1, 'updated': 1, 'skipped': 1})
+        self.assertEqual(sorted(outcomes.values()), ['inserted', 'skipped', 'updated'])
+        self.assertEqual(Dbbi.objects.count(), 3)
+
+    def test_same_file_not_parsed_again(self):
+        upload = workbook('same.xlsx', {'sheet': synthetic_sheet(2, 3, seed=9)})
+        data = self.client.post('/api/dbbi/parse-excel/', {'file': upload}).json()
+        self.assertEqual((data['inserted'], data['skipped']), (6, 0))
+
+        upload.seek(0)
+        data = self.client.post('/api/dbbi/parse-excel/', {'file': upload}).json()
+        self.assertEqual(data['message'], 'File already processed, no changes')
+        self.assertEqual((data['inserted'], data['skipped']), (0, 6))
+
+        upload.seek(0)
+        data = self.client.post('/api/dbbi/parse-excel/', {'file': upload, 'force': '1'}).json()
+        self.assertEqual((data['inserted'], data['updated'], data['skipped']), (0, 0, 6))
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class RunningTotalTests(TestCase):
+
+    def test_cumulative_recomputed_after_backfill(self):
+        bulk_save([record('Bob', 2, travail='07:00:00'), record('Bob', 3, travail='06:00:00')])
+        bulk_save([record('Bob', 1, travail='08:00:00')])
+
+        cumulated = list(Dbbi.objects.order_by('epoch_day').values_list('travail_cumulee_seconds', flat=True))
+        self.assertEqual(cumulated, [8 * 3600, 15 * 3600, 21 * 3600])
+        total = RunningTotal.objects.get(employee_key=employee_index('Bob'))
+        self.assertEqual(total.cumulative_seconds, 21 * 3600)
+
+    def test_appended_days_continue_the_total(self):
+        bulk_save([record('Bob', 1), record('Bob', 2)])
+        report = bulk_save([record('Bob', 3), record('Bob', 4)])
+        self.assertEqual(report.inserted, 2)
+        last = Dbbi.objects.order_by('-epoch_day').first()
+        self.assertEqual(last.travail_cumulee_seconds, 32 * 3600)
+
+    def test_writers_serialized(self):
+        with mock.patch('myapp.services.kpi_cache.lock_writes', wraps=kpi_cache.lock_writes) as lock:
+            bulk_save([record('Bob', 1)])
+        lock.assert_called_once_with()
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class ConcurrentUploadTests(TransactionTestCase):
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_overlapping_uploads(self):
+        """Two uploads sharing a new employee and some (nom, date) rows, at the same time"""
+        batches = [[record('Lou', day) for day in (1, 2, 3)], [record('Lou', day) for day in (2, 3, 4)]]
+        barrier = threading.Barrier(len(batches))
+        reports = []
+        errors = []
+
+        def upload(batch):
+            try:
+                barrier.wait()
+                reports.append(bulk_save(batch))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upload, args=(batch,)) for batch in batches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(report.inserted for report in reports), 4)
+        self.assertEqual(RunningTotal.objects.get(employee_key=employee_index('Lou')).cumulative_seconds, 32 * 3600)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_TRACEMALLOC=False)
+class ProfilingDumpTests(TestCase):
+    url = '/api/kpi-cache/stats/?_profile=cprofile'
+
+    def test_dump_for_staff_only(self):
+        directory = temporary_directory(self)
+        with override_settings(PROFILING_DUMP_DIR=directory):
+            response = self.client.get(self.url)
+            self.assertNotIn('X-Profile-Dump', response)
+            self.assertEqual(os.listdir(directory), [])
+
+            self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(directory), [response['X-Profile-Dump']])
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class AsyncKpiViewTests(TransactionTestCase):
+    """The pool threads query on their own connections, so the rows must be committed"""
+
+    def test_same_payload_as_sync_views(self):
+        bulk_save([record('Jo', day, travail='07:30:00') for day in (1, 2, 3)] + [record('Kim', 2)])
+        for path in ('heures-realisees/', 'dashboard-summary/', 'all-employees/', 'weekly-trends/'):
+            for query in ('', '?nom=Jo&start=2024-01-02'):
+                with self.subTest(path=path, query=query):
+                    expected = self.client.get(f'/api/{path}{query}')
+                    response = self.client.get(f'/api/async/{path}{query}')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), expected.json())
+        self.assertEqual(self.client.get('/api/async/heures-realisees/').json()['total_seconds'], 109800)
+
+    def test_invalid_period(self):
+        response = self.client.get('/api/async/heures-realisees/?start=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class ParallelScanTests(TestCase):
+
+    def setUp(self):
+        bulk_save(
+            [record('Jo', day, travail='07:30:00') for day in range(1, 9)]
+            + [record('Kim', day) for day in (2, 5, 6)]
+            + [record('Lou', 3, entree='Abs', sortie='Abs', travail='Abs')]
+        )
+
+    def test_same_result_as_serial_kpis(self):
+        # Several pk ranges merged in one process; the test database is not
+        # visible to pool workers
+        self.assertGreater(len(parallel_scan.pk_ranges(chunk_size=3)), 1)
+        result = parallel_scan.parallel_kpis(workers=1, chunk_size=3)
+        self.assertEqual(kpi_values(result), kpi_values(compute_kpis()))
+        self.assertEqual(result.employees(), [('Jo', 60 * 3600), ('Kim', 24 * 3600), ('Lou', 0)])
+
+    def test_daily_groups_match_the_aggregates(self):
+        groups = parallel_scan.parallel_daily_groups(workers=1, chunk_size=3)
+        stored = {
+            (row.employee_key, row.day): (row.worked_seconds, row.days_present, row.absences)
+            for row in DailyAggregate.objects.all()
+        }
+        self.assertEqual(
+            {key: (group['worked'], group['present'], group['absent']) for key, group in groups.items()},
+            stored,
+        )
+
+    def test_refuses_pool_inside_a_transaction(self):
+        with self.assertRaisesMessage(RuntimeError, 'cannot run inside a transaction'):
+            list(parallel_scan._scan(sum, workers=2, ranges=[(0, 1), (1, 2)]))
+
+
+class ParallelScanPoolTests(SimpleTestCase):
+
+    def test_results_in_range_order(self):
+        ranges = [(low, low + 10) for low in range(0, 100, 10)]
+        self.assertEqual(list(parallel_scan._scan(sum, workers=2, ranges=ranges)), [sum(r) for r in ranges])
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False, AUDIT_ASYNC=False, BATCH_PARSE_WORKERS=1)
+class BatchUploadTests(TestCase):
+    url = '/api/dbbi/parse-excel/batch/'
+
+    def test_report_per_file(self):
+        january = workbook('jan.xlsx', {'jan': synthetic_sheet(2, 5, seed=1)})
+        february = workbook('feb.xlsx', {
+            'feb': synthetic_sheet(2, 5, seed=2, start=datetime.date(2024, 2, 1)),
+            'notes': pd.DataFrame({'a': [1]}),
+        })
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('2024/feb.xlsx', february.getvalue())
+            zf.writestr('readme.txt', 'not a workbook')
+        archive.seek(0)
+        archive.name = 'q1.zip'
+
+        data = self.client.post(self.url, {'files': [january, archive]}).json()
+        files = {f['file_name']: f for f in data['files']}
+        self.assertEqual(files['jan.xlsx']['status'], 'parsed')
+        self.assertEqual(files['jan.xlsx']['inserted'], 10)
+        self.assertEqual(files['q1.zip/2024/feb.xlsx']['status'], 'parsed')
+        self.assertEqual(files['q1.zip/2024/feb.xlsx']['inserted'], 10)
+        self.assertEqual([sheet['sheet'] for sheet in files['q1.zip/2024/feb.xlsx']['sheets']], ['feb', 'notes'])
+        self.assertIn('error', files['q1.zip/2024/feb.xlsx']['sheets'][1])
+        self.assertEqual(files['q1.zip/readme.txt']['status'], 'error')
+        self.assertEqual(data['inserted'], 20)
+        self.assertEqual(Dbbi.objects.count(), 20)
+
+        january.seek(0)
+        data = self.client.post(self.url, {'files': [january]}).json()
+        self.assertEqual(data['files'][0]['status'], 'already_ingested')
+        self.assertEqual(data['inserted'], 0)
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class ExportTests(TestCase):
+
+    def setUp(self):
+        bulk_save([
+            record('Jo', 1, travail='07:00:00'),
+            record('Jo', 2),
+            record('Jo', 3, entree='Abs', sortie='Abs', travail='Abs'),
+            record('Kim', 2, travail='09:30:00'),
+        ])
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_dbbi_csv(self):
+        response, content = self.download('/api/export/dbbi.csv?nom=Jo&start=2024-01-02')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="pointages_Jo_2024-01-02.csv"')
+        self.assertTrue(content.startswith('\ufeff'.encode()))
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows, [
+            OUTPUT_COLUMNS,
+            ['Jo', '2024-01-02', '08:00:00', '16:00:00', '08:00:00', '15:00:00'],
+            ['Jo', '2024-01-03', 'Abs', 'Abs', 'Abs', '15:00:00'],
+        ])
+
+    def test_dbbi_xlsx(self):
+        response, content = self.download('/api/export/dbbi.xlsx')
+        sheet = pd.read_excel(io.BytesIO(content), sheet_name='pointages', dtype=str)
+        self.assertEqual(list(sheet.columns), OUTPUT_COLUMNS)
+        self.assertEqual(list(sheet['Nom']), ['Jo', 'Jo', 'Kim', 'Jo'])
+        self.assertEqual(list(sheet['Travail']), ['07:00:00', '08:00:00', '09:30:00', 'Abs'])
+
+    def test_kpis(self):
+        expected = [
+            ['Jo', '2', '1', '15:00:00', '16:00:00', '01:00:00'],
+            ['Kim', '1', '0', '09:30:00', '08:00:00', '00:00:00'],
+        ]
+        _, content = self.download('/api/export/kpis.csv')
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[1:], expected)
+
+        _, content = self.download('/api/export/kpis.xlsx')
+        sheet = pd.read_excel(io.BytesIO(content), dtype=str)
+        self.assertEqual(sheet.values.tolist(), expected)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/export/dbbi.pdf')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), "the archive needs pyarrow")
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=True)
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        settings_override = override_settings(ARCHIVE_DIR=os.path.join(temporary_directory(self), 'archive'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def save(self, records):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_save(records)
+
+    def test_round_trip(self):
+        from myapp.services import archive
+
+        self.save([record('Jo', 30), record('Jo', 31, entree='Abs', sortie='Abs', travail='Abs'), record('Kim', 31)])
+        self.save([record('Jo', 30, travail='06:00:00'), dict(record('Kim', 1), Date=datetime.date(2024, 2, 1))])
+
+        frame = archive.read(('nom', 'day', 'travail_seconds', 'absent'))
+        rows = sorted(
+            (nom, day.isoformat(), None if pd.isna(seconds) else int(seconds), bool(absent))
+            for nom, day, seconds, absent in frame.itertuples(index=False)
+        )
+        self.assertEqual(rows, [
+            ('Jo', '2024-01-30', 6 * 3600, False),
+            ('Jo', '2024-01-31', None, True),
+            ('Kim', '2024-01-31', 8 * 3600, False),
+            ('Kim', '2024-02-01', 8 * 3600, False),
+        ])
+        self.assertEqual(list(archive.read(('nom',), start=datetime.date(2024, 2, 1))['nom']), ['Kim'])
+        self.assertEqual(kpi_values(archive.build_snapshot().kpis()), kpi_values(compute_kpis()))
+        stored = {
+            (row.employee_key, row.day): {
+                'nom': row.nom, 'worked': row.worked_seconds, 'present': row.days_present, 'absent': row.absences,
+            }
+            for row in DailyAggregate.objects.all()
+        }
+        self.assertEqual(archive.daily_groups(), stored)
+
+        # Rebuilt from the table: one file per month, same content
+        self.assertEqual(archive.rebuild(), (4, 2))
+        for year, month in ((2024, 1), (2024, 2)):
+            files = os.listdir(os.path.join(settings.ARCHIVE_DIR, f'year={year}', f'month={month:02}'))
+            self.assertEqual(len(files), 1)
+        rebuilt = archive.read(('nom', 'day', 'travail_seconds', 'absent'))
+        pd.testing.assert_frame_equal(
+            rebuilt.sort_values(['nom', 'day'], ignore_index=True),
+            frame.sort_values(['nom', 'day'], ignore_index=True),
+        )
+
+
+@override_settings(BLIND_INDEX_KEY=BLIND_INDEX_KEY, ARCHIVE_ENABLED=False)
+class KeyRotationTests(TestCase):
+
+    def setUp(self):
+        self.old_key = settings.FIELD_ENCRYPTION_KEY[0]
+        self.new_key = Fernet.generate_key().decode()
+        self.records = [record('Eve', day) for day in range(1, 4)]
+        bulk_save(self.records)
+        self.checkpoint = os.path.join(temporary_directory(self), 'key_rotation.json')
+
+    @contextmanager
+    def keys(self, *keys, blind_index_key=BLIND_INDEX_KEY):
+        # The encrypted fields read their MultiFernet once, at import
+        with override_settings(FIELD_ENCRYPTION_KEY=keys, BLIND_INDEX_KEY=blind_index_key):
+            with mock.patch('encrypted_model_fields.fields.CRYPTER', get_crypter()):
+                yield
+
+    def command(self, *args, **options):
+        return call_command(*args, workers=1, stdout=io.StringIO(), **options)
+
+    def tokens(self):
+        return list(Dbbi.objects.annotate(raw=Cast('nom', TextField())).values_list('raw', flat=True))
+
+    def test_rotate_then_check(self):
+        with self.keys(self.new_key, self.old_key):
+            with self.assertRaisesMessage(CommandError, 'Old keys are still needed'):
+                self.command('rotate_keys', check=True)
+            self.command('rotate_keys', checkpoint=self.checkpoint)
+            self.command('rotate_keys', check=True)
+
+        new = Fernet(self.new_key)
+        self.assertEqual({new.decrypt(token.encode()).decode() for token in self.tokens()}, {'Eve'})
+
+        with self.keys(self.new_key):
+            self.command('rotate_keys', check=True)
+            # Lookups still match once the old key is gone
+            self.assertEqual(bulk_save(self.records).as_dict(), {'inserted': 0, 'updated': 0, 'skipped': 3})
+
+    def test_check_fails_while_blind_index_key_is_an_old_field_key(self):
+        with self.keys(self.old_key, blind_index_key=self.old_key):
+            self.command('reindex_blind_index')
+        with self.keys(self.new_key, self.old_key, blind_index_key=self.old_key):
+            self.command('rotate_keys', checkpoint=self.checkpoint)
+            with self.assertRaisesMessage(CommandError, 'BLIND_INDEX_KEY is one of the old field keys'):
+                self.command('rotate_keys', check=True)
+        with self.keys(self.new_key, self.old_key):
+            with self.assertRaisesMessage(CommandError, 'Stored rows do not match'):
+                self.command('rotate_keys', check=True)
+            self.command('reindex_blind_index')
+            self.command('rotate_keys', check=True)
+            self.assertEqual(bulk_save(self.records).as_dict(), {'inserted': 0, 'updated': 0, 'skipped': 3})
@@ -4,8 +4,12 @@ from . import views
 
 urlpatterns = [
     path('dbbi/parse-excel/', views.parse_excel_view, name='parse-excel'),
+    path('dbbi/parse-excel/batch/', views.parse_excel_batch_view, name='parse-excel-batch'),
+    path('dbbi/jobs/<int:job_id>/', views.ingestion_job_status, name='ingestion-job'),
     path('dbbi/sample-data/', views.sample_data_view, name='sample-data'),
     path('dbbi/all/', views.get_all_dbbi, name='get-all-dbbi'),
+    path('export/dbbi.<str:file_format>', views.export_dbbi, name='export-dbbi'),
+    path('export/kpis.<str:file_format>', views.export_kpis, name='export-kpis'),
     
     path('best-employee/', views.best_employee, name='best_employee'),
     path('worst-employee/', views.worst_employee, name='worst_employee'),
@@ -16,6 +20,22 @@ urlpatterns = [
     path('heures-realisees/', views.heures_realisees, name='heures_realisees'),
     path('heures-restantes/', views.heures_restantes, name='heures_restantes'),
     path('heures-restantes-par-employe/', views.heures_restantes_par_employe, name='heures_restantes_par_employe'),
+
+    # Async (ASGI) versions of the KPI endpoints
+    path('async/best-employee/', views.async_best_employee, name='async_best_employee'),
+    path('async/worst-employee/', views.async_worst_employee, name='async_worst_employee'),
+    path('async/average-hours/', views.async_average_hours, name='async_average_hours'),
+    path('async/weekly-trends/', views.async_weekly_trends, name='async_weekly_trends'),
+    path('async/all-employees/', views.async_all_employees_stats, name='async_all_employees'),
+    path('async/dashboard-summary/', views.async_dashboard_summary, name='async_dashboard_summary'),
+    path('async/heures-realisees/', views.async_heures_realisees, name='async_heures_realisees'),
+    path('async/heures-restantes/', views.async_heures_restantes, name='async_heures_restantes'),
+    path('async/heures-restantes-par-employe/', views.async_heures_restantes_par_employe,
+         name='async_heures_restantes_par_employe'),
+
+    path('kpi-cache/stats/', views.kpi_cache_stats, name='kpi_cache_stats'),
+    path('profiling/metrics/', views.profiling_metrics, name='profiling_metrics'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
 
 